@@ -0,0 +1,313 @@
+import argparse
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+# Local HTTP API for queueing comparisons, so scripts and teammates can share one running tool instead of
+# each starting Python and reading the MDR. Jobs run in a small pool of worker processes that keep the MDRs
+# they have loaded; extra jobs wait in a bounded queue. pandas and the engine are only imported once a job runs.
+#
+# The app serves it when started with MDR_API=1 (on port MDR_API_PORT, 8765 by default). Without the window:
+#   py mdr_api.py [--port 8765] [--workers 2] [--queue 20]
+#
+#   GET    /api/mdrs                      cached MDRs that jobs can use by name
+#   POST   /api/jobs                      form fields: mdr (cached MDR name or MDR .xlsx path), and either
+#                                         file (an uploaded RCC export) or rcc (path to one)  -> {"id": ...}
+#   GET    /api/jobs                      every job's status
+#   GET    /api/jobs/{id}                 one job's status: queued, running, done or error
+#   GET    /api/jobs/{id}/result.json     the missing fields, one object per row
+#   GET    /api/jobs/{id}/result.xlsx     the output workbook, as the app exports it
+#   DELETE /api/jobs/{id}                 cancels a queued job, or deletes a finished one and its files
+
+API_PORT = int(os.environ.get("MDR_API_PORT", 8765))
+API_WORKERS = int(os.environ.get("MDR_API_WORKERS", 2)) # Comparisons that run at the same time.
+API_QUEUE = int(os.environ.get("MDR_API_QUEUE", 20)) # Jobs that may be queued or running before new ones are refused.
+WORKER_MDRS = 2 # MDRs each worker keeps loaded and indexed.
+
+# Set in each worker process: MDRs already loaded, keyed by name and file signature, most recently used last.
+worker_mdrs = OrderedDict()
+
+def default_jobs_dir():
+    # Uploads and outputs, next to the MDR snapshot cache.
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "MDRComparisonTool", "jobs")
+
+def load_mdr(mdr):
+    """
+    Returns a worker's loaded MDR and its form index, reading it on first use.
+
+    Args:
+        mdr (str): Path to an MDR .xlsx file, or the name of a cached MDR snapshot.
+
+    Returns:
+        tuple: (pd.DataFrame, PrefixIndex)
+    """
+    from mdr_engine import read_sheet, mdr_form_index, snapshot_cache
+    path = mdr if os.path.isfile(mdr) else os.path.join(snapshot_cache.directory, mdr)
+    stat = os.stat(path)
+    key = (mdr, stat.st_mtime_ns, stat.st_size)
+    if key not in worker_mdrs:
+        mdr_df = read_sheet(mdr, "Data") if os.path.isfile(mdr) else snapshot_cache.read(mdr)
+        worker_mdrs[key] = (mdr_df, mdr_form_index(mdr_df["mdes_form_name"]))
+        while len(worker_mdrs) > WORKER_MDRS:
+            worker_mdrs.popitem(last=False)
+    worker_mdrs.move_to_end(key)
+    return worker_mdrs[key]
+
+def run_job(rcc, mdr, out_path, now):
+    # Runs in a worker process: the batch's export checks, the comparison, the output workbook and result.json
+    # next to it. Only the row count goes back, so the app doesn't hold on to every job's result.
+    from mdr_batch import check_export
+    from mdr_engine import compare_files, write_output
+    from mdr_profile import Profile
+    check_export(rcc)
+    mdr_df, form_index = load_mdr(mdr)
+    profile = Profile(memory=False)
+    result = compare_files(rcc, mdr_df, form_index, profile)
+    write_output(result, out_path, mdr, now, profile=profile)
+    result.to_json(os.path.join(os.path.dirname(out_path), "result.json"), orient="records")
+    return len(result)
+
+class QueueFull(Exception):
+    pass
+
+class JobQueue:
+    """
+    Comparison jobs, run by a bounded pool of worker processes.
+
+    Args:
+        workers (int): Worker processes, i.e. jobs that run at the same time.
+        max_pending (int): Jobs that may be queued or running at once. submit raises QueueFull beyond that.
+        directory (str): Folder for uploads and outputs, one subfolder per job. Defaults to default_jobs_dir().
+        keep (int): Finished jobs to keep. Older ones are deleted with their files.
+    """
+    def __init__(self, workers=API_WORKERS, max_pending=API_QUEUE, directory=None, keep=200):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.directory = directory or default_jobs_dir()
+        self.keep = keep
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        self.pool = None
+
+    def start_pool(self):
+        # Spawned, not forked, so the server's threads are not copied into the workers.
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def job_dir(self, job_id):
+        return os.path.join(self.directory, job_id)
+
+    def resolve_mdr(self, mdr):
+        # Raises FileNotFoundError unless mdr names a cached MDR or an MDR file on disk.
+        from mdr_snapshot import SnapshotCache
+        if mdr in {entry["file"] for entry in SnapshotCache().entries()}:
+            return mdr
+        if os.path.isfile(mdr) and mdr.lower().endswith(".xlsx"):
+            return os.path.abspath(mdr)
+        raise FileNotFoundError(f"'{mdr}' is neither a cached MDR (see /api/mdrs) nor an MDR .xlsx file.")
+
+    def submit(self, mdr, rcc=None, upload=None, filename=None):
+        """
+        Queues a comparison.
+
+        Args:
+            mdr (str): Name of a cached MDR, or path to an MDR .xlsx file.
+            rcc (str): Path to the RCC export. Either this or upload.
+            upload (file): Open binary file with an uploaded RCC export, copied into the job's folder.
+            filename (str): The upload's file name, used for the output's name.
+
+        Returns:
+            dict: The job's status.
+        """
+        from mdr_batch import output_path
+        mdr = self.resolve_mdr(mdr)
+        if (rcc is None) == (upload is None):
+            raise ValueError("Give either an uploaded RCC export or the path to one, not both.")
+        if rcc is not None and not os.path.isfile(rcc):
+            raise FileNotFoundError(f"RCC export '{rcc}' not found.")
+
+        if self.pending() >= self.max_pending:
+            raise QueueFull(f"{self.max_pending} jobs are already queued or running. Try again later.")
+        job_id = uuid.uuid4().hex
+        folder = self.job_dir(job_id)
+        os.makedirs(folder)
+        if upload is not None:
+            rcc = os.path.join(folder, os.path.basename(filename or "") or "rcc_export.xlsx")
+            with open(rcc, "wb") as f:
+                shutil.copyfileobj(upload, f) # Outside the lock, so a large upload doesn't hold up other clients.
+        now = datetime.now()
+        job = {"id": job_id, "status": "queued", "rcc": os.path.basename(rcc), "mdr": os.path.basename(mdr),
+               "submitted": now.isoformat(timespec="seconds"), "finished": None, "seconds": None,
+               "missing_fields": None, "error": None, "output": output_path(rcc, folder, now), "queued_at": time.perf_counter()}
+
+        with self.lock:
+            if self.pending() >= self.max_pending: # Others may have filled the queue during the upload.
+                shutil.rmtree(folder, ignore_errors=True)
+                raise QueueFull(f"{self.max_pending} jobs are already queued or running. Try again later.")
+            if self.pool is None:
+                self.start_pool()
+            try:
+                job["future"] = self.pool.submit(run_job, rcc, mdr, job["output"], now)
+            except BrokenProcessPool:
+                self.start_pool() # A worker died (ex: out of memory); its jobs failed, later ones get a fresh pool.
+                job["future"] = self.pool.submit(run_job, rcc, mdr, job["output"], now)
+            self.jobs[job_id] = job
+            self.evict()
+        job["future"].add_done_callback(lambda future: self.finish(job, future))
+        return self.status(job_id)
+
+    def finish(self, job, future):
+        # Runs on the pool's thread when a job ends.
+        with self.lock:
+            job["seconds"] = round(time.perf_counter() - job["queued_at"], 2)
+            job["finished"] = datetime.now().isoformat(timespec="seconds")
+            if future.cancelled():
+                job["status"], job["error"] = "error", "Cancelled."
+            elif future.exception() is not None:
+                e = future.exception()
+                job["status"], job["error"] = "error", f"{type(e).__name__}: {e}"
+            else:
+                job["missing_fields"] = future.result()
+                job["status"] = "done"
+
+    def pending(self):
+        # Take the lock first for an exact count.
+        return sum(job["status"] in ("queued", "running") for job in list(self.jobs.values()))
+
+    def get(self, job_id):
+        # A copy of the job, as it is updated from other threads. Raises KeyError for an unknown job.
+        with self.lock:
+            job = self.jobs[job_id]
+            if job["status"] == "queued" and job["future"].running():
+                job["status"] = "running"
+            return dict(job)
+
+    def result_path(self, job_id, kind):
+        # The job's result.json, or its output workbook for 'xlsx'.
+        return self.get(job_id)["output"] if kind == "xlsx" else os.path.join(self.job_dir(job_id), "result.json")
+
+    def status(self, job_id):
+        job = self.get(job_id)
+        return {key: value for key, value in job.items() if key not in ("future", "output", "queued_at")}
+
+    def cancel(self, job_id):
+        """
+        Cancels a queued job, or deletes a finished one and its files.
+
+        Returns:
+            bool: False if the job is running, which can't be stopped.
+        """
+        job = self.get(job_id)
+        if job["status"] == "running" or (job["status"] == "queued" and not job["future"].cancel()):
+            return False
+        with self.lock:
+            self.jobs.pop(job_id, None)
+        shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+        return True
+
+    def evict(self):
+        # Deletes the oldest finished jobs beyond keep.
+        finished = [job_id for job_id, job in self.jobs.items() if job["status"] in ("done", "error")]
+        for job_id in finished[:max(0, len(finished) - self.keep)]:
+            del self.jobs[job_id]
+            shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+def register(app, jobs):
+    """
+    Adds the /api routes to a FastAPI app, such as NiceGUI's.
+
+    Args:
+        app (FastAPI): App to add the routes to.
+        jobs (JobQueue): Queue the routes submit to.
+    """
+    from fastapi import File, Form, HTTPException, UploadFile
+    from fastapi.responses import FileResponse
+
+    def find(job_id):
+        try:
+            return jobs.get(job_id)
+        except KeyError:
+            raise HTTPException(404, f"No job '{job_id}'.")
+
+    def finished(job_id):
+        job = find(job_id)
+        if job["status"] != "done":
+            raise HTTPException(409, job["error"] or f"Job is {job['status']}.")
+        return job
+
+    # Plain (not async) routes run in FastAPI's thread pool, so copying uploads doesn't hold up the app's window.
+    @app.get("/api/mdrs")
+    def list_mdrs():
+        from mdr_snapshot import SnapshotCache
+        return SnapshotCache().entries()
+
+    @app.post("/api/jobs", status_code=202)
+    def submit_job(mdr: str = Form(...), rcc: str = Form(None), file: UploadFile = File(None)):
+        try:
+            return jobs.submit(mdr, rcc, file.file if file else None, file.filename if file else None)
+        except FileNotFoundError as e:
+            raise HTTPException(404, str(e))
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+        except QueueFull as e:
+            raise HTTPException(429, str(e))
+
+    @app.get("/api/jobs")
+    def list_jobs():
+        statuses = []
+        for job_id in list(jobs.jobs):
+            try:
+                statuses.append(jobs.status(job_id))
+            except KeyError:
+                pass # Deleted meanwhile.
+        return statuses
+
+    @app.get("/api/jobs/{job_id}")
+    def job_status(job_id: str):
+        find(job_id)
+        return jobs.status(job_id)
+
+    @app.get("/api/jobs/{job_id}/result.json")
+    def job_json(job_id: str):
+        finished(job_id)
+        return FileResponse(jobs.result_path(job_id, "json"), media_type="application/json")
+
+    @app.get("/api/jobs/{job_id}/result.xlsx")
+    def job_xlsx(job_id: str):
+        finished(job_id)
+        output = jobs.result_path(job_id, "xlsx")
+        return FileResponse(output, filename=os.path.basename(output), media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
+    @app.delete("/api/jobs/{job_id}")
+    def delete_job(job_id: str):
+        find(job_id)
+        if not jobs.cancel(job_id):
+            raise HTTPException(409, "Job is running and can't be cancelled.")
+        return {"id": job_id, "deleted": True}
+
+if __name__ == "__main__":
+    from fastapi import FastAPI
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the comparison job API without the app window.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on. Keep the default to only accept local clients.")
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--workers", type=int, default=API_WORKERS, help="Comparisons that run at the same time.")
+    parser.add_argument("--queue", type=int, default=API_QUEUE, help="Jobs that may be queued or running before new ones are refused.")
+    args = parser.parse_args()
+
+    jobs = JobQueue(args.workers, args.queue)
+    api = FastAPI(title="MDR Comparison Tool", on_shutdown=[jobs.shutdown])
+    register(api, jobs)
+    uvicorn.run(api, host=args.host, port=args.port)
@@ -0,0 +1,212 @@
+import argparse
+import glob
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, TimeoutError, as_completed
+from datetime import datetime
+import pandas as pd
+from mdr_engine import compare_files, read_sheet, mdr_form_index, check_file_for_sheet, check_file_for_col, write_output, RCC_COLUMNS
+from mdr_incremental import compare_incremental
+from mdr_snapshot import file_hash
+
+# Headless batch mode: compares many RCC metadata exports against one MDR, without the app window.
+# The MDR is read and indexed once, then each study is compared in its own worker process.
+#
+#   py mdr_batch.py --mdr MDR_RCC_metadata_Apr_23_2025.xlsx exports/ other/study.xlsx "more/*.xlsx"
+
+# Set in each worker by _init_worker, so the MDR is sent to a worker once rather than once per study.
+worker_mdr = {}
+
+def find_exports(paths):
+    """
+    Expands folders and glob patterns into a list of .xlsx files.
+
+    Args:
+        paths (list): Files, folders or glob patterns.
+
+    Returns:
+        list: Unique .xlsx paths in the order given. Excel lock files (~$...) are skipped.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            matches = sorted(glob.glob(os.path.join(path, "*.xlsx")))
+        else:
+            matches = sorted(glob.glob(path)) or [path]
+        for match in matches:
+            if not os.path.basename(match).startswith("~$") and match not in files:
+                files.append(match)
+    return files
+
+def output_path(rcc, out_dir, now, study=None):
+    # MDRComparisonOutput_<study file>_<run time>.xlsx, next to the export unless out_dir is given.
+    folder = out_dir or os.path.dirname(os.path.abspath(rcc))
+    study = study or os.path.splitext(os.path.basename(rcc))[0]
+    return os.path.join(folder, f"MDRComparisonOutput_{study}{now.strftime('_%b_%d_%Y_%H_%M_%S')}.xlsx")
+
+def output_paths(rccs, out_dir, now):
+    """
+    Output workbook paths for a batch, one per export and never the same twice.
+
+    Exports with the same file name from different folders would share an output in out_dir, since the
+    whole batch has one run time. Their outputs are named <folder>_<study file> instead, with a counter
+    added if that still clashes.
+
+    Args:
+        rccs (list): Paths to the RCC metadata exports.
+        out_dir (str): Folder for the outputs, or None to write each next to its export.
+        now (datetime): Run time of the batch.
+
+    Returns:
+        dict: Export path -> output path.
+    """
+    plain = {rcc: output_path(rcc, out_dir, now) for rcc in rccs}
+    clashes = Counter(os.path.normcase(path) for path in plain.values())
+    paths, used = {}, set()
+    for rcc in rccs:
+        path = plain[rcc]
+        if clashes[os.path.normcase(path)] > 1:
+            folder = os.path.basename(os.path.dirname(os.path.abspath(rcc)))
+            path = output_path(rcc, out_dir, now, f"{folder}_{os.path.splitext(os.path.basename(rcc))[0]}")
+        base, count = path[:-len(".xlsx")], 1
+        while os.path.normcase(path) in used:
+            count += 1
+            path = f"{base}_{count}.xlsx"
+        used.add(os.path.normcase(path))
+        paths[rcc] = path
+    return paths
+
+def _init_worker(mdr_df, form_index, mdr_key=None):
+    worker_mdr["df"] = mdr_df
+    worker_mdr["index"] = form_index
+    worker_mdr["key"] = mdr_key # Content hash of the MDR file, for compare_incremental.
+
+def check_export(rcc):
+    # Raises ValueError unless the file is an RCC metadata export with the columns the comparison needs.
+    if not check_file_for_sheet("Item", rcc):
+        raise ValueError("'Item' sheet not found. Please use RCC Metadata Export.")
+    missing = check_file_for_col(RCC_COLUMNS, rcc, "Item")
+    if missing is not True:
+        raise ValueError(f"'{missing}' column not found. Please use RCC Metadata Export.")
+
+def _summary_row(rcc, status="OK", error=None):
+    return {"Study File": rcc, "Status": status, "Missing Fields": None, "Mandatory": None, "Optionally Required": None, "Output File": None, "Seconds": None, "Error": error}
+
+def compare_study(rcc, mdr, out_dir, now, incremental=False, formats=(), out_path=None):
+    """
+    Compares one RCC export against the worker's MDR and writes its output workbook.
+
+    Args:
+        rcc (str): Path to the RCC metadata export.
+        mdr (str): Path to the MDR file, for the 'Info' sheet.
+        out_dir (str): Folder for the output, or None to write next to the export.
+        now (datetime): Run time, shared by every study in the batch.
+        incremental (bool): Only recompute the forms that changed since the study's last run, and add a 'Changes' sheet.
+        formats (iterable): Also write the result as 'csv' and/or 'parquet' next to the workbook.
+        out_path (str): Output workbook path, from output_paths. Defaults to output_path(rcc, out_dir, now).
+
+    Returns:
+        dict: One summary row for the study.
+    """
+    start = time.perf_counter()
+    row = _summary_row(rcc)
+    try:
+        check_export(rcc)
+        changes = None
+        if incremental:
+            result, changes, recomputed = compare_incremental(rcc, worker_mdr["df"], form_index=worker_mdr["index"], mdr_key=worker_mdr.get("key"))
+            row["New Since Last Run"] = int((changes["Change"] == "New").sum())
+            row["Resolved Since Last Run"] = int((changes["Change"] == "Resolved").sum())
+            row["Forms Recomputed"] = len(recomputed)
+        else:
+            result = compare_files(rcc, worker_mdr["df"], worker_mdr["index"])
+        row["Output File"] = out_path or output_path(rcc, out_dir, now)
+        write_output(result, row["Output File"], mdr, now, changes, formats)
+        row["Missing Fields"] = len(result)
+        row["Mandatory"] = int((result["Type"] == "Mandatory").sum())
+        row["Optionally Required"] = int((result["Type"] == "Optionally Required").sum())
+    except Exception as e:
+        row["Status"] = "Error"
+        row["Error"] = f"{type(e).__name__}: {e}"
+    row["Seconds"] = round(time.perf_counter() - start, 2)
+    return row
+
+def _stop_pool(pool):
+    # Drops the queued studies and terminates the workers still comparing one, freeing their memory.
+    # ProcessPoolExecutor has no public way to stop a running task, so its worker processes are terminated directly.
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in list((pool._processes or {}).values()):
+        process.terminate()
+
+def run_batch(mdr, rccs, out_dir=None, workers=None, incremental=False, formats=(), timeout=None):
+    """
+    Compares each RCC export against one MDR in a process pool.
+
+    Args:
+        mdr (str): Path to the MDR file.
+        rccs (list): Paths to RCC metadata exports.
+        out_dir (str): Folder for the outputs, or None to write each next to its export.
+        workers (int): Number of worker processes. Defaults to the number of CPUs.
+        incremental (bool): Only recompute the forms that changed since each study's last run.
+        formats (iterable): Also write each result as 'csv' and/or 'parquet'.
+        timeout (float): Seconds the studies may take, counted once the MDR is loaded. Studies still running or queued then are stopped and reported as timed out.
+
+    Returns:
+        pd.DataFrame: Summary with one row per study, in the order given.
+    """
+    now = datetime.now()
+    mdr_df = read_sheet(mdr, "Data") # Read (or loaded from its snapshot) once for the whole batch.
+    form_index = mdr_form_index(mdr_df["mdes_form_name"])
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(rccs)))
+    rows = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(mdr_df, form_index, file_hash(mdr))) as pool:
+        outputs = output_paths(rccs, out_dir, now)
+        futures = {pool.submit(compare_study, rcc, mdr, out_dir, now, incremental, formats, outputs[rcc]): rcc for rcc in rccs}
+        try:
+            for future in as_completed(futures, timeout=timeout):
+                row = future.result()
+                rows[futures[future]] = row
+                print(f"[{len(rows)}/{len(rccs)}] {row['Status']:5} {os.path.basename(row['Study File'])}" + (f": {row['Missing Fields']} missing field(s)" if row["Status"] == "OK" else f": {row['Error']}"), flush=True)
+        except TimeoutError:
+            _stop_pool(pool)
+            unfinished = [rcc for rcc in rccs if rcc not in rows]
+            for rcc in unfinished:
+                rows[rcc] = _summary_row(rcc, "Timed out", f"The batch ran past its {timeout:g}s timeout.")
+            print(f"Timed out after {timeout:g}s; stopped {len(unfinished)} unfinished study(ies).", flush=True)
+    return pd.DataFrame([rows[rcc] for rcc in rccs])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare RCC metadata exports against one MDR file without opening the app.")
+    parser.add_argument("--mdr", required=True, help="MDR file (MDR_RCC_metadata_<Mon>_<DD>_<YYYY>.xlsx).")
+    parser.add_argument("rcc", nargs="+", help="RCC metadata exports: files, folders or glob patterns.")
+    parser.add_argument("--out", help="Folder for the output workbooks and summary. Defaults to next to each export.")
+    parser.add_argument("--workers", type=int, help="Number of worker processes. Defaults to the number of CPUs.")
+    parser.add_argument("--incremental", action="store_true", help="Only recompute forms that changed since each study's last run, and list the changes.")
+    parser.add_argument("--timeout", type=float, help="Seconds the studies may take, once the MDR is loaded, before unfinished ones are stopped.")
+    parser.add_argument("--also", action="append", choices=["csv", "parquet"], default=[], help="Also write each result as CSV or Parquet next to its workbook. Can be given twice.")
+    args = parser.parse_args(argv)
+
+    rccs = [rcc for rcc in find_exports(args.rcc) if os.path.abspath(rcc) != os.path.abspath(args.mdr)]
+    if not rccs:
+        print("No RCC metadata exports found.")
+        return 2
+    if not check_file_for_sheet("Data", args.mdr):
+        print("'Data' sheet not found in the MDR file.")
+        return 2
+
+    start = time.perf_counter()
+    summary = run_batch(args.mdr, rccs, args.out, args.workers, args.incremental, args.also, args.timeout)
+    summary_path = os.path.join(args.out or os.path.dirname(os.path.abspath(rccs[0])), f"MDRComparisonSummary{datetime.now().strftime('_%b_%d_%Y_%H_%M_%S')}.xlsx")
+    summary.to_excel(summary_path, index=False, sheet_name="Summary", freeze_panes=(1, 1))
+
+    failed = (summary["Status"] != "OK").sum()
+    print(f"Compared {len(summary) - failed} of {len(summary)} studies in {time.perf_counter() - start:.1f}s. Summary: {summary_path}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import time
+import warnings
+import pandas as pd
+from mdr_engine import compare_files, read_columns, read_mdr, RCC_COLUMNS
+from mdr_profile import Profile
+from mdr_synthetic import make_study, write_study
+
+# Benchmark for compare_files on synthetic studies (see mdr_synthetic.py), from hundreds to millions of rows.
+# Times every stage, and checks the result against the reference implementations in extras/ so a speed-up
+# can't quietly change which fields are reported missing:
+#   - extras/reference_compare.py, the comparison as the app first shipped: the result must be identical.
+#   - extras/compare_files.py, the older prototype: it reads an older MDR layout, reports every missing field
+#     as Mandatory and has no latest/library filters, so it gets only the rows that pass those filters and
+#     only the missing (Form Name, Item) pairs are compared.
+# Both references try every MDR name against every RCC row, so they only run up to --check-limit RCC rows.
+#
+#   py mdr_benchmark.py --rows 500 5000 50000 500000 --repeat 3 --json benchmark.json
+
+EXTRAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "extras")
+
+def load_extra(name):
+    # Imports a module from extras/, which is not a package.
+    spec = importlib.util.spec_from_file_location(name, os.path.join(EXTRAS, name + ".py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def relevant_mdr(mdr):
+    # The MDR rows that pass isolate_mdr's filters.
+    return mdr[(mdr["latest"] == True) & mdr["f_ver"].str.contains("Volume 3") & mdr["library"].isin(["Core", "Efficacy"]) & (mdr["mandatory_to_be_collected"] == True)]
+
+def legacy_compare(rcc, mdr):
+    # extras/compare_files.py's compare_files, run on DataFrames instead of file paths.
+    legacy = load_extra("compare_files")
+    rcc_df = rcc[["RefName Path", "Variable Name"]].copy()
+    rcc_df["RefName Path"] = rcc_df["RefName Path"].str.split(" >> ").str[0]
+    mdr_df = legacy.isolate_mdr(mdr, rcc_df)
+    relevant_forms = sorted(set(mdr_df["mdes_form_name"]), reverse=True)
+    relevant_vars = sorted(set(mdr_df["item_refname"].astype("str")), reverse=True)
+    rcc_df = rcc_df.merge(legacy.map_rcc_formnames(relevant_forms, rcc_df)["mdes_form_name"], how="outer", left_index=True, right_index=True)
+    rcc_df = rcc_df.merge(legacy.map_rcc_itemnames(relevant_vars, rcc_df)["item_refname"], how="outer", left_index=True, right_index=True).dropna(axis=0)
+    return legacy.return_missing_fields(rcc_df, legacy.create_fake_study(rcc_df, mdr_df))
+
+def missing_pairs(df):
+    return sorted(zip(df["Form Name"], df["Item"]))
+
+def check(rcc, mdr, result):
+    """
+    Compares a compare_files result with the reference implementations.
+
+    Args:
+        rcc (pd.DataFrame): RCC export the result was computed from.
+        mdr (pd.DataFrame): MDR the result was computed from.
+        result (pd.DataFrame): compare_files(rcc, mdr).
+
+    Returns:
+        str: 'OK', or what differs.
+    """
+    problems = []
+    reference = load_extra("reference_compare").compare_files(rcc, mdr)
+    try:
+        pd.testing.assert_frame_equal(result, reference)
+    except AssertionError as e:
+        problems.append(f"differs from extras/reference_compare.py: {str(e).splitlines()[0]}")
+
+    relevant = relevant_mdr(mdr)
+    if missing_pairs(compare_files(rcc, relevant)) != missing_pairs(legacy_compare(rcc, relevant)):
+        problems.append("missing (Form Name, Item) pairs differ from extras/compare_files.py")
+    return "; ".join(problems) or "OK"
+
+def run_size(rows, seed=0, repeat=3, memory=False, check_limit=20000, xlsx_dir=None):
+    """
+    Benchmarks compare_files on one synthetic study.
+
+    Args:
+        rows (int): Approximate number of rows in each sheet.
+        seed (int): Random seed for the study.
+        repeat (int): Number of timed runs. The fastest is reported.
+        memory (bool): Record each stage's peak memory, in one extra run.
+        check_limit (int): Largest RCC export to check against the references.
+        xlsx_dir (str): If given, also write the study as .xlsx files there and time reading them.
+
+    Returns:
+        dict: Sizes, seconds per stage, peak MB per stage (if memory), and the check result.
+    """
+    start = time.perf_counter()
+    rcc, mdr = make_study(rows, seed)
+    report = {"rows": rows, "seed": seed, "rcc_rows": len(rcc), "mdr_rows": len(mdr), "generate_seconds": round(time.perf_counter() - start, 2)}
+
+    stages = {}
+    if xlsx_dir:
+        rcc_path, mdr_path = write_study(rcc, mdr, xlsx_dir, seed)
+        for _ in range(repeat):
+            profile = Profile(memory=False)
+            with profile.stage("read_rcc") as stage:
+                stage["Rows Out"] = len(read_columns(rcc_path, "Item", RCC_COLUMNS))
+            with profile.stage("read_mdr") as stage:
+                stage["Rows Out"] = len(read_mdr(mdr_path)) # Straight from the .xlsx, not the snapshot cache.
+            for record in profile.stages:
+                stages[record["Stage"]] = min(stages.get(record["Stage"], float("inf")), record["Seconds"])
+
+    for _ in range(repeat):
+        profile = Profile(memory=False)
+        result = compare_files(rcc, mdr, profile=profile)
+        for record in profile.stages:
+            stages[record["Stage"]] = min(stages.get(record["Stage"], float("inf")), record["Seconds"])
+    report["stage_seconds"] = stages
+    report["compare_seconds"] = round(sum(seconds for stage, seconds in stages.items() if not stage.startswith("read_")), 4)
+    report["missing_fields"] = len(result)
+
+    if memory:
+        profile = Profile(memory=True)
+        compare_files(rcc, mdr, profile=profile)
+        report["stage_peak_mb"] = {record["Stage"]: record["Peak MB"] for record in profile.stages}
+
+    report["check"] = check(rcc, mdr, result) if len(rcc) <= check_limit else "skipped"
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark compare_files on synthetic studies and check it against the reference implementations.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[500, 5000, 50000, 500000], help="Approximate rows per sheet, one study per value.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the studies.")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per study. The fastest is reported.")
+    parser.add_argument("--memory", action="store_true", help="Also record each stage's peak memory.")
+    parser.add_argument("--check-limit", type=int, default=20000, help="Largest RCC export to check against the references, which are slow.")
+    parser.add_argument("--xlsx", nargs="?", const="", help="Also write each study as .xlsx (to this folder, or a temporary one) and time reading it.")
+    parser.add_argument("--json", help="Save the results as JSON, to compare between versions.")
+    args = parser.parse_args(argv)
+
+    warnings.filterwarnings("ignore", category=pd.errors.SettingWithCopyWarning) # Raised by the shared rcc_df handling, in every implementation.
+    reports = []
+    with tempfile.TemporaryDirectory() as temp:
+        xlsx_dir = None if args.xlsx is None else (args.xlsx or temp)
+        for rows in args.rows:
+            report = run_size(rows, args.seed, args.repeat, args.memory, args.check_limit, xlsx_dir)
+            reports.append(report)
+            stages = "  ".join(f"{stage} {seconds:.3f}" for stage, seconds in report["stage_seconds"].items())
+            print(f"{report['rcc_rows']:>9} RCC / {report['mdr_rows']:>9} MDR rows: compare {report['compare_seconds']:.3f}s, {report['missing_fields']} missing, check {report['check']}", flush=True)
+            print(f"    {stages}", flush=True)
+            if args.memory:
+                print("    peak MB  " + "  ".join(f"{stage} {mb}" for stage, mb in report["stage_peak_mb"].items()), flush=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+    return 1 if any(report["check"] not in ("OK", "skipped") for report in reports) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
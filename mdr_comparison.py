@@ -1,137 +1,147 @@
-import pandas as pd
-import numpy as np
-import openpyxl as op
+import time
+started = time.perf_counter() # For the startup-time budget, measured up to the window's first connection.
 from datetime import datetime
 import os
-from warnings import filterwarnings
-from nicegui import app, ui, run, html, native
-import requests
+import sys
+from nicegui import app, ui, run, html, native, background_tasks
 import asyncio
-import re
+from collections import OrderedDict
+# pandas, openpyxl and requests are only imported once they are needed (mdr_engine and version_check), so the window opens sooner.
 
 version_num = "1.0"
-file_url = "https://raw.githubusercontent.com/malib-pfe/MDRComparisonTool/refs/heads/main/version.txt"
+STARTUP_BUDGET = float(os.environ.get("MDR_STARTUP_BUDGET", 3)) # Seconds from launch until the window is shown.
 
-# Filter out warnings due to weird Workbook naming.
-filterwarnings("ignore", message="Workbook contains no default style", category=UserWarning)
-def read_file_from_github(raw_url):
+class WorkbookCache:
     """
-    Reads a file from GitHub using its raw URL.
+    Keeps recently parsed sheets in memory so each workbook is decoded at most once per session.
+
+    Entries are keyed by path, sheet name, modification time and size, so a file that changes on
+    disk is read again. The least recently used entry is evicted once max_entries is reached.
 
     Args:
-        raw_url (str): The raw URL of the file on GitHub.
+        max_entries (int): Number of sheets to keep in memory.
+    """
+    def __init__(self, max_entries=4):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    @staticmethod
+    def key(filename, sheetname):
+        stat = os.stat(filename)
+        return (os.path.abspath(filename), sheetname, stat.st_mtime_ns, stat.st_size)
+
+    def get(self, filename, sheetname):
+        key = self.key(filename, sheetname)
+        if key not in self.entries:
+            return None
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, filename, sheetname, value):
+        key = self.key(filename, sheetname)
+        # Drop older versions of the same sheet so stale copies don't take up a slot.
+        for stale in [k for k in self.entries if k[:2] == key[:2] and k != key]:
+            del self.entries[stale]
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+class ResultView:
+    """
+    Server-side paging, sorting and search over a comparison result, so the table only sends the visible page to the browser.
 
-    Returns:
-        str: The content of the file, or None if an error occurred.
+    The search index (lower-cased Form Name, Item and Description per row) is built once per result,
+    and sort orders are computed once per column and reused for every page.
+
+    Args:
+        df (pd.DataFrame): Result from compare_files.
     """
+    search_columns = ['Form Name', 'Item', 'Description']
+
+    def __init__(self, df):
+        self.df = df.reset_index(drop=True)
+        columns = [self.df[column].fillna('').astype(str) for column in self.search_columns]
+        self.search_index = (columns[0] + '\n' + columns[1] + '\n' + columns[2]).str.lower()
+        self.orders = {}
+        self.last_search = (None, None) # Paging through the same search reuses its matches.
+
+    def order(self, column, descending):
+        # Row positions sorted by column. Stable, so ties keep the result's order like the client-side sort did.
+        if (column, descending) not in self.orders:
+            values = self.df[column].astype(str)
+            self.orders[(column, descending)] = values.sort_values(ascending=not descending, kind='stable').index.to_numpy()
+        return self.orders[(column, descending)]
+
+    def page(self, page=1, rows_per_page=50, sort_by=None, descending=False, search=''):
+        """
+        Returns one page of rows.
+
+        Args:
+            page (int): 1-based page number.
+            rows_per_page (int): Rows per page. 0 returns every matching row.
+            sort_by (str): Column to sort by, or None for the result's order.
+            descending (bool): Sort in descending order.
+            search (str): Case-insensitive text to look for in Form Name, Item and Description.
+
+        Returns:
+            tuple: (rows, total). rows is a list of dicts with an 'id' key, ready for ui.table. total is the number of matching rows.
+        """
+        positions = self.order(sort_by, descending) if sort_by in self.df.columns else self.df.index.to_numpy()
+        if search:
+            if self.last_search[0] != search.lower():
+                self.last_search = (search.lower(), self.search_index.str.contains(search.lower(), regex=False).to_numpy())
+            matches = self.last_search[1]
+            positions = positions[matches[positions]]
+        total = len(positions)
+        if rows_per_page:
+            positions = positions[(page - 1) * rows_per_page:page * rows_per_page]
+        rows = self.df.iloc[positions]
+        rows = rows.astype(object).where(rows.notna(), None).assign(id=positions) # NaN is not valid JSON.
+        return rows.to_dict('records'), total
+
+workbook_cache = WorkbookCache()
+pending_loads = {} # Sheets currently being parsed -> (SheetJob, task), so a prefetch and an execute share one read.
+
+def start_load(filename, sheetname):
+    # Starts parsing a sheet in a worker process, unless it already is. Returns its SheetJob and the task that
+    # waits for it and puts the sheet in workbook_cache. The job can be cancelled, and reports progress to its on_event.
+    key = WorkbookCache.key(filename, sheetname)
+    if key not in pending_loads:
+        from mdr_worker import SheetJob
+        job = SheetJob(filename, sheetname).start()
+        pending_loads[key] = (job, asyncio.ensure_future(finish_load(key, job, filename, sheetname)))
+    return pending_loads[key]
+
+async def finish_load(key, job, filename, sheetname):
     try:
-        response = requests.get(raw_url)
-        response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
-        return response.text
-    except requests.exceptions.RequestException as e:
-        print(f"Error reading file from GitHub: {e}")
-        return None
-
-def isolate_mdr(mdr_df, rcc_df):
-    # Function to only get relevant forms for specific RCC study from MDR since MDR has ALL forms.
-    
-    # Isolate the items to compare from MDR.
-    mdr_df = mdr_df[mdr_df["latest"] == True] # Only items that are the latest
-    mdr_df = mdr_df[mdr_df['f_ver'].str.contains('Volume 3')]
-    mdr_df = mdr_df[(mdr_df['library'] == 'Core') | (mdr_df['library'] == 'Efficacy')]
-    mdr_df = mdr_df[mdr_df["mandatory_to_be_collected"] == True]
-    mdr_df = mdr_df[["f_ver","mdes_form_name", "mde_name", "item_refname", "crf_collection_guidance", "mandatory_to_be_collected", "mde_is_cond_reqd"]]
-
-    # Get the most up to date version of each item. Sort by descending to search longer names first.
-    #mdr_df = mdr_df.sort_values('s_ver', ascending=False).drop_duplicates(["mdes_form_name","item_refname"])
-    mdr_df = mdr_df.sort_values("mdes_form_name", ascending = False)
-
-    # Get only the relevant forms and items.
-    mdr_df['Form Present in RCC Build'] = np.nan
-    mdr_df['Form Present in RCC Build'] = mdr_df["mdes_form_name"].apply(lambda form: form if rcc_df['RefName Path'].str.startswith(form).any() else False) # Lambda: return the form if the RCC Form starts with a mandatory form name.
-    mdr_df = mdr_df[mdr_df['Form Present in RCC Build'] != False] # Removes any forms that were not found in RCC export.
-    return mdr_df
-
-def map_rcc_formnames(relevant_forms, rcc_df):
-    df = rcc_df["RefName Path"].apply((lambda form: searchform if form.startswith(searchform) else np.nan for searchform in relevant_forms), axis = 1) # Lambda: return the matching searchform from the list of relevant MDR forms if the RCC Form starts with the searchform
-    df = df.apply(lambda row: pd.Series(row.dropna().values), axis=1) # Moves all results to the left and removes na's.
-    df = df.apply(lambda row: max(row.astype(str), key=len), axis = 1) # Get the longest string match. Some forms can match twice, but a longer match is more exact. (ex: AE001 vs. AE001_1)
-    df = pd.DataFrame(df, columns=['mdes_form_name'])
+        df = await job.wait_async()
+    finally:
+        pending_loads.pop(key, None)
+    workbook_cache.put(filename, sheetname, df)
     return df
 
-def map_rcc_itemnames(relevant_vars, rcc_df):
-    df_vars = rcc_df["Variable Name"].apply((lambda item: searchitem if item.startswith(searchitem) else np.nan for searchitem in relevant_vars), axis = 1) # Lambda: return the form if the RCC Form starts with a mandatory form name.
-    df_vars = df_vars.apply(lambda row: pd.Series(row.dropna().values), axis=1) # Gets rid of all na values, and moves any values into one column.
-    df_vars = df_vars.apply(lambda row: max(row.astype(str), key=len), axis = 1)
-    df_vars = pd.DataFrame(df_vars, columns=["item_refname"])
-    return df_vars
-
-def create_fake_study(rcc_df, mdr_df):
-    # Creates list of mandatory elements using names from RCC.
-    relevant_rcc_form_names = sorted(set(rcc_df["RefName Path"])) # List of RCC forms
-    rcc_names_df = pd.DataFrame(relevant_rcc_form_names, columns=["RefName Path"]) # New dataframe with just a list of the RCC Forms.
-    mandatory_df = rcc_names_df.merge(rcc_df, on = "RefName Path")[["RefName Path","mdes_form_name"]] # Merge rcc_df onto names df to have mapping of RCC form names to MDR form names.
-    mandatory_df = mandatory_df.drop_duplicates(["RefName Path","mdes_form_name"]) # Gives a list that maps RCC Forms to MDR Form Names
-    mandatory_df = mandatory_df.merge(mdr_df,how = 'left', on=['mdes_form_name']) # Merge MDR onto the mandatory df where the MDR names match
-    mandatory_df = mandatory_df[mandatory_df["mandatory_to_be_collected"] == True] # Keep only mandatory fields for this fake study
-    mandatory_df = mandatory_df[['RefName Path', 'item_refname',"crf_collection_guidance", "mde_is_cond_reqd"]] # Keep only relevant columns.
-    # 'RefName Path', 'item_refname',"crf_collection_guidance"
-    # AE001            AESCAT            instruction
-    # AE001_1          AESCAT            instruction 
-    # Example row where first column is the RCC create event, the second column is the mandatory fields associated, and the last column is any context.
-    return mandatory_df
-
-def return_missing_fields(rcc_df, mandatory_df):
-    final_df = mandatory_df.merge(rcc_df,how = 'left', on=["RefName Path", "item_refname"]) # Merge export where RCC Form names and MDR item names match.
-    final_df = final_df[final_df['Variable Name'].isnull()] # Variable name is RCC item name, if it's null, then a mandatory field is missing.
-    final_df['Type'] = final_df.mde_is_cond_reqd.apply(lambda x: "Optionally Required" if x == True else "Mandatory")
-    final_df.insert(loc=3, column='Description', value=[f"{item} is marked as {mand_string} in the MDR Repository; however, it is not being collected in {form}." for form, item, mand_string in zip(final_df['RefName Path'], final_df['item_refname'], final_df['Type'])]) # Inserts description of error.
-    #final_df['Description'] = [f"{item} is marked as 'Mandatory' in the MDR Repository; however, it is not being collected in {form}." for form, item in zip(final_df['RefName Path'], final_df['item_refname'])] 
-    final_df = final_df.rename(columns={'RefName Path': 'Form Name', 'item_refname': 'Item', "crf_collection_guidance":'Context'})
-    final_df = final_df.drop(columns=["Variable Name", 'mdes_form_name', 'mde_is_cond_reqd']) # Drops empty columns.
-    final_df = final_df[['Form Name', 'Item', 'Type', 'Description','Context']]
-    return final_df
-
-def compare_files(rcc:str,mdr:str) -> pd.DataFrame:
-    # Full print option used for development.
-    pd.set_option("display.max_rows", None, "display.max_columns", None)
-    
-    # Make user-provided files into dataframes.
-    mdr_df = pd.read_excel(mdr, sheet_name="Data",engine="openpyxl")
-    rcc_df = pd.read_excel(rcc, sheet_name="Item",engine="openpyxl")
-
-    # Get relevant dataframe from export metadata.
-    rcc_df = rcc_df[["RefName Path","Variable Name"]]
-    rcc_df['RefName Path'] = rcc_df['RefName Path'].str.split(' >> ').str[0] # Isolates Form from rest of path in metadata.
-
-    mdr_df = isolate_mdr(mdr_df, rcc_df)
-
-    # Get list of forms and variables from MDR.
-    relevant_forms = sorted(set(mdr_df["mdes_form_name"]), reverse = True) # Set gives a list of unique items (removes dups), sorted Z-A to get longer strings first
-    relevant_vars = sorted(set(mdr_df["item_refname"].astype("str")), reverse=True)
-    
-    # Create a df that maps RCC export Form Names to their MDR form Names
-    mapped_rcc_formnames = map_rcc_formnames(relevant_forms, rcc_df)
-    rcc_df = rcc_df.merge(mapped_rcc_formnames['mdes_form_name'], how='outer', left_index=True, right_index=True) # Merge MDR Form names onto RCC metadata export
-
-    # Create a df that maps RCC export Item Names to their MDR item Names   
-    mapped_rcc_itemnames = map_rcc_itemnames(relevant_vars, rcc_df)
-    rcc_df = rcc_df.merge(mapped_rcc_itemnames['item_refname'], how='outer', left_index=True, right_index=True).dropna(axis=0) # Merge MDR item names onto RCC metadata export. Drop any forms that don't exist in MDR.
-    
-    # Create a fake study of mandatory items using a list of RCC forms from the export. This captures all duplicates of the same forms (DM001 and DM001_1: means two sets of DM001 forms, not just presence of DM001 forms)
-    mandatory_df = create_fake_study(rcc_df, mdr_df)
-    
-    # Compares what is found in the required fields df just made to actual study.
-    missing_df = return_missing_fields(rcc_df, mandatory_df)
-    return missing_df
+async def prefetch(filename, sheetname):
+    # Starts parsing a chosen file straight away, so Execute doesn't have to wait as long. Execute reports
+    # any error, as it reads the file again if this read failed or was cancelled.
+    if workbook_cache.get(filename, sheetname) is None:
+        try:
+            await asyncio.shield(start_load(filename, sheetname)[1])
+        except Exception:
+            pass
 
 async def choose_rcc_file():
     file = await app.native.main_window.create_file_dialog(allow_multiple=False, file_types= ('Excel Files (*.xlsx)',))
     if file is not None:
         n3 = ui.notification("Checking RCC Metadata Export...", type='ongoing', timeout=None, spinner=True)
+        from mdr_engine import check_file_for_sheet, check_file_for_col
         if check_file_for_sheet('Item', file[0]):
-            is_md = await run.cpu_bound(check_file_for_col, ["RefName Path","Variable Name"] ,file[0], 'Item')
+            is_md = check_file_for_col(["RefName Path","Variable Name"] ,file[0], 'Item')
             if is_md is True:
+                background_tasks.create(prefetch(file[0], 'Item'), name='prefetch rcc')
                 n3.message = "Metadata export selected."
                 n3.type = "positive"
                 n3.timeout = 3
@@ -156,9 +166,11 @@ async def choose_mdr_file():
     file = await app.native.main_window.create_file_dialog(allow_multiple=False, save_filename=filename, file_types= ('Excel Files (*.xlsx)',))
     if file is not None:
         n2 = ui.notification("Checking MDR file...", type='ongoing', timeout=None, spinner=True)
+        from mdr_engine import check_file_for_sheet, check_file_for_col
         if check_file_for_sheet('Data', file[0]):
-            is_pmdr = await run.cpu_bound(check_file_for_col, ["f_ver","mdes_form_name", "mde_name", "item_refname", "crf_collection_guidance", "mandatory_to_be_collected", "mde_is_cond_reqd"], file[0], 'Data')
+            is_pmdr = check_file_for_col(["f_ver","mdes_form_name", "mde_name", "item_refname", "crf_collection_guidance", "mandatory_to_be_collected", "mde_is_cond_reqd"], file[0], 'Data')
             if is_pmdr is True:
+                background_tasks.create(prefetch(file[0], 'Data'), name='prefetch mdr')
                 if date_format in file[0]:
                     n2.message = "Today's MDR file selected."
                     n2.type = "positive"
@@ -184,44 +196,63 @@ async def choose_mdr_file():
     else:
         ui.notify('No file selected.')
 
-def check_file_for_sheet(sheetname, filename):
-    xl = pd.ExcelFile(filename)
-    return sheetname in xl.sheet_names
-
-def check_file_for_filter(sheetname, filename):
-    workbook = op.load_workbook(filename)
-    sheet = workbook[sheetname]
-    return sheet.auto_filter
-
-def remove_filter(sheetname, filename):
-    wb = op.load_workbook(filename)
-    ws = wb[sheetname]
-    ws.auto_filter.ref = None
-    wb.save(filename)
-    return True
-
-def check_file_for_col(colnames, filename, sheetname):
-    df = pd.read_excel(filename, sheet_name=sheetname,engine="openpyxl")
-    for colname in colnames:
-        try:
-            df_col = df[colname]
-        except:
-            return colname
-    return True
-
 async def handle_execute():
     n = ui.notification("Executing... Please Wait.", type='ongoing', timeout=None, spinner=True)
     executeBtn.disable()
     rcc = rcc_filepath.text
     mdr = mdr_filepath.text
     global result
-    result = await run.cpu_bound(compare_files, rcc, mdr)
-    state['table'] = ui.table.from_pandas(result, pagination=0,column_defaults={'style': 'text-wrap: wrap'}).classes('my-sticky-header-table').style('width: 99%')
-    state['table'].columns[0]['sortable'] = True
-    state['table'].columns[1]['sortable'] = True
-    state['table'].columns[2]['sortable'] = True
-    state['table'].columns[3]['sortable'] = True
-    state['input'] = ui.input('Search table').bind_value(state["table"], 'filter')
+    from mdr_worker import ComparisonJob, describe
+    def show_progress(event):
+        n.message = describe(event)
+    # Each file is read in a worker process (or taken from the cache) and then compared in another, all of which
+    # report their progress here and are terminated by Cancel. A file whose prefetch is still running is not
+    # read again: its job is shown and waited for instead.
+    state['jobs'] = []
+    cancelBtn.enable()
+    try:
+        sheets = {}
+        loads = []
+        for filename, sheetname in ((mdr, 'Data'), (rcc, 'Item')):
+            sheets[sheetname] = workbook_cache.get(filename, sheetname)
+            if sheets[sheetname] is None:
+                job, task = start_load(filename, sheetname)
+                job.on_event = show_progress
+                state['jobs'].append(job)
+                loads.append((sheetname, task))
+        for sheetname, task in loads:
+            sheets[sheetname] = await asyncio.shield(task)
+        job = ComparisonJob(sheets['Item'], sheets['Data']).start()
+        state['jobs'].append(job)
+        result = await job.wait_async(on_event=show_progress)
+    except Exception as e:
+        for job in state['jobs']:
+            job.cancel(str(e)) # Only does something if the wait itself failed, or another job did: no worker is left running.
+        n.message = str(e)
+        n.type = "warning" if str(e) == "Cancelled." else "negative"
+        n.timeout = 3
+        n.spinner = False
+        executeBtn.enable()
+        return
+    finally:
+        cancelBtn.disable()
+    # The reads' stages (if the files weren't cached yet) come before the comparison's own.
+    state['profile'] = job.profile
+    state['profile'].stages = [stage for load in state['jobs'][:-1] if load.profile is not None for stage in load.profile.stages] + job.profile.stages
+    state['view'] = await run.io_bound(ResultView, result)
+    # Server-side pagination: the table only holds the visible page and asks show_page for the next one.
+    columns = [{'name': col, 'label': col, 'field': col, 'sortable': col != 'Context', 'align': 'left'} for col in result.columns]
+    pagination = {'page': 1, 'rowsPerPage': 50, 'sortBy': None, 'descending': False, 'rowsNumber': len(result)}
+    state['table'] = ui.table(columns=columns, rows=[], row_key='id', pagination=pagination, column_defaults={'style': 'text-wrap: wrap'}).classes('my-sticky-header-table').style('width: 99%')
+    state['table'].props(':rows-per-page-options="[25, 50, 100, 250]"')
+    state['table'].on('request', lambda e: show_page(e.args))
+    state['input'] = ui.input('Search Form Name, Item or Description').bind_value(state["table"], 'filter')
+    await show_page({'pagination': pagination, 'filter': ''})
+    # Where the time went, per stage of the comparison, and the most memory its worker process had used by the end of each.
+    profile = state['profile']
+    with ui.expansion(f"Run details: {profile.total_seconds():.2f}s").style('width: 99%') as state['details']:
+        ui.table(columns=[{'name': col, 'label': col, 'field': col, 'align': 'left'} for col in profile.columns],
+                 rows=[dict(zip(profile.columns, row)) for row in profile.rows()], row_key='Stage').props('dense flat')
     n.message = "Complete!"
     n.type = "positive"
     n.timeout = 3
@@ -229,9 +260,18 @@ async def handle_execute():
     exportBtn.enable()
     clearBtn.enable()
 
+async def show_page(request):
+    # Handles the table's request event (page, sort or search changed) by sending just the requested page.
+    pagination = request['pagination']
+    rows, total = await run.io_bound(state['view'].page, pagination['page'], pagination['rowsPerPage'], pagination.get('sortBy'), pagination.get('descending', False), request.get('filter') or '')
+    state['table'].rows = rows
+    state['table'].pagination = {**pagination, 'rowsNumber': total}
+
 async def reset_page():
     state["table"].delete()
     state['input'].delete()
+    state['details'].delete()
+    state.pop('view', None)
     exportBtn.enable()
     executeBtn.enable()
     exportBtn.disable()
@@ -248,99 +288,124 @@ async def export():
     now_string = now.strftime("_%b_%d_%Y_%H_%M_%S")
     timestamp_string = folder_path + filename + now_string + '.xlsx'
 
-    # Build info dataframe
-    mdr_date = re.findall(r'(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)_\d{2}_\d{4}', mdr_filepath.text)
-    info_dict = {
-        "Tool Run Date": now.strftime('%b %d %Y'),
-        "MDR File Date": mdr_date[0].replace('_', ' ')
-    }
-    info_df = pd.DataFrame([info_dict]).T
-
-    # Added builder comment column.
-    df = result
-    df["Builder Comments"] = ""
-    with pd.ExcelWriter(timestamp_string, engine= "openpyxl") as writer:  
-        df.to_excel(writer, index= False, sheet_name = 'O   utput', freeze_panes=(1, 1))
-        info_df.to_excel(writer, header= False, sheet_name = 'Info')
+    from mdr_engine import write_output
+    formats = [fmt for fmt, box in format_boxes.items() if box.value]
+    # A thread rather than a process, so the result is written where it is instead of being copied to a worker.
+    await run.io_bound(write_output, result, timestamp_string, mdr_filepath.text, now, None, formats, state.get('profile'))
 
     ui.notify("Table export located in " + folder_path)
 
-# Define the UI.
-ui.add_css(
-    """
-    .my-sticky-header-table {
-        /* height or max-height is important */
-        max-height: 400px;
-        /* this is when the loading indicator appears */
-        /* prevent scrolling behind sticky top row on focus */
-    }
-    
-    .my-sticky-header-table .q-table__top,
-    .my-sticky-header-table .q-table__bottom,
-    .my-sticky-header-table thead tr:first-child th {
-        /* bg color is important for th; just specify one */
-        background-color: #00b4ff;
-    }
-    
-    .my-sticky-header-table thead tr th {
-        position: sticky;
-        z-index: 1;
-    }
-    
-    .my-sticky-header-table thead tr:first-child th {
-        top: 0;
-    }
-    
-    .my-sticky-header-table.q-table--loading thead tr:last-child th {
-        /* height of all previous header rows */
-        top: 48px;
-    }
-    
-    .my-sticky-header-table tbody {
-        /* height of all previous header rows */
-        scroll-margin-top: 48px;
-    }  
-    """
-)
-
-state = {}
-
-with ui.header():
-    ui.label('MDR Comparison Tool').style('font-size: 200%; font-weight: bold').classes('absolute-center')
-    
-with ui.row():
-    ui.label('Study Metadata:').style('font-weight:bold')
-    rcc_filepath = ui.label()
-
-ui.button('Select RCC Study Metadata Export',on_click=choose_rcc_file)
+async def check_version():
+    # Runs after the window is up. Disables Execute if a newer version is published, or if none could be found, as before.
+    from version_check import latest_version
+    latest = await run.io_bound(latest_version)
+    if latest != version_num:
+        executeBtn.disable()
+        with executeBtn.client.layout:
+            ui.notification("This app is out of date. Please use newest version.", timeout=False, type = "negative")
+
+async def warm_up():
+    # Imports the comparison code in the background so the first file check doesn't wait for pandas.
+    await run.io_bound(__import__, 'mdr_engine')
+
+def report_startup():
+    if 'startup' not in state:
+        state['startup'] = time.perf_counter() - started
+        print(f"Window ready in {state['startup']:.2f}s (budget {STARTUP_BUDGET:.1f}s)" + (" - over budget" if state['startup'] > STARTUP_BUDGET else ""))
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        # Headless batch mode, ex: py mdr_comparison.py --mdr MDR_RCC_metadata_Apr_23_2025.xlsx exports/
+        import mdr_batch
+        sys.exit(mdr_batch.main())
+
+    # Define the UI.
+    ui.add_css(
+        """
+        .my-sticky-header-table {
+            /* height or max-height is important */
+            max-height: 400px;
+            /* this is when the loading indicator appears */
+            /* prevent scrolling behind sticky top row on focus */
+        }
+
+        .my-sticky-header-table .q-table__top,
+        .my-sticky-header-table .q-table__bottom,
+        .my-sticky-header-table thead tr:first-child th {
+            /* bg color is important for th; just specify one */
+            background-color: #00b4ff;
+        }
+
+        .my-sticky-header-table thead tr th {
+            position: sticky;
+            z-index: 1;
+        }
+
+        .my-sticky-header-table thead tr:first-child th {
+            top: 0;
+        }
+
+        .my-sticky-header-table.q-table--loading thead tr:last-child th {
+            /* height of all previous header rows */
+            top: 48px;
+        }
+
+        .my-sticky-header-table tbody {
+            /* height of all previous header rows */
+            scroll-margin-top: 48px;
+        }  
+        """
+    )
+
+    state = {}
+
+    with ui.header():
+        ui.label('MDR Comparison Tool').style('font-size: 200%; font-weight: bold').classes('absolute-center')
+
+    with ui.row():
+        ui.label('Study Metadata:').style('font-weight:bold')
+        rcc_filepath = ui.label()
+
+    ui.button('Select RCC Study Metadata Export',on_click=choose_rcc_file)
+
+    with ui.row():
+        ui.label("Link to RCC MDR Folder:").style('font-weight:bold')
+        ui.link("Link", "https://pfizer.sharepoint.com/:f:/r/sites/TASL/PMO/CDISC/Weekly%20Forum%20Meeting%20Minutes/2.%20MDR%20Library%20(and%20CDISC)%20Content/RCC%20Standard%20Metadata%20Files?csf=1&web=1&e=W9AlxW", new_tab= True)
+
+    with ui.row():
+        ui.label('MDR Metadata:').style('font-weight:bold')
+        mdr_filepath = ui.label()
+
+    ui.button("Select Today's RCC MDR Metadata",on_click=choose_mdr_file)
+
+    ui.space()
+
+    with ui.row():
+        executeBtn = ui.button("Execute Comparison", on_click= lambda: handle_execute() if rcc_filepath.text != '' and mdr_filepath.text != '' else ui.notify('Please select both files to proceed.'))
+        cancelBtn = ui.button("Cancel", on_click= lambda: [job.cancel() for job in state['jobs']])
+        cancelBtn.disable()
+        clearBtn = ui.button("Clear Table", on_click= reset_page)
+        clearBtn.disable()
+        exportBtn = ui.button("Export Table", on_click = export)
+        exportBtn.disable()
+        format_boxes = {'csv': ui.checkbox('Also save CSV'), 'parquet': ui.checkbox('Also save Parquet')}
+
+    app.on_startup(warm_up)
+    app.on_startup(check_version)
+    app.on_connect(report_startup)
+
+    port = None # Any free port, unless the job API is on: its clients need a fixed one.
+    if os.environ.get("MDR_API") == "1":
+        # Local HTTP endpoints for queueing comparisons from scripts (see mdr_api.py).
+        import mdr_api
+        jobs = mdr_api.JobQueue()
+        mdr_api.register(app, jobs)
+        app.on_shutdown(jobs.shutdown)
+        port = mdr_api.API_PORT
 
-with ui.row():
-    ui.label("Link to RCC MDR Folder:").style('font-weight:bold')
-    ui.link("Link", "https://pfizer.sharepoint.com/:f:/r/sites/TASL/PMO/CDISC/Weekly%20Forum%20Meeting%20Minutes/2.%20MDR%20Library%20(and%20CDISC)%20Content/RCC%20Standard%20Metadata%20Files?csf=1&web=1&e=W9AlxW", new_tab= True)
-
-with ui.row():
-    ui.label('MDR Metadata:').style('font-weight:bold')
-    mdr_filepath = ui.label()
-
-ui.button("Select Today's RCC MDR Metadata",on_click=choose_mdr_file)
-
-ui.space()
-
-with ui.row():
-    executeBtn = ui.button("Execute Comparison", on_click= lambda: handle_execute() if rcc_filepath.text != '' and mdr_filepath.text != '' else ui.notify('Please select both files to proceed.'))
-    clearBtn = ui.button("Clear Table", on_click= reset_page)
-    clearBtn.disable()
-    exportBtn = ui.button("Export Table", on_click = export)
-    exportBtn.disable()
-
-file_content = read_file_from_github(file_url)
-if file_content != version_num:
-    executeBtn.disable()
-    ui.notification("This app is out of date. Please use newest version.", timeout=False, type = "negative")
-
-try:
-    ui.run(native=True, reload=False, title="MDR Comparison Tool")
-except asyncio.CancelledError as e:
-    pass
-except KeyboardInterrupt:
-    pass
+    try:
+        ui.run(native=True, reload=False, title="MDR Comparison Tool", port=port)
+    except asyncio.CancelledError as e:
+        pass
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,365 @@
+import pandas as pd
+import numpy as np
+import openpyxl as op
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+from datetime import datetime
+from functools import partial
+import os
+from warnings import filterwarnings
+from workbook_io import read_sheet_names, read_header, read_auto_filter, read_columns
+from mdr_snapshot import SnapshotCache, MDR_DATE
+from mdr_profile import Profile
+
+# Comparison engine: reads the RCC metadata export and the MDR, and finds the mandatory MDR fields
+# missing from the study. Used by the app (mdr_comparison.py) and the batch command line (mdr_batch.py).
+
+# Columns the comparison uses. Only these are read from each file.
+RCC_COLUMNS = ["RefName Path","Variable Name"]
+MDR_COLUMNS = ["f_ver","mdes_form_name", "mde_name", "item_refname", "crf_collection_guidance", "mandatory_to_be_collected", "mde_is_cond_reqd", "latest", "library"]
+TRUE_VALUES = (True, "True", "TRUE", "true")
+
+# Filter out warnings due to weird Workbook naming.
+filterwarnings("ignore", message="Workbook contains no default style", category=UserWarning)
+
+snapshot_cache = SnapshotCache() # Filtered MDRs on disk, shared between sessions.
+
+def is_relevant_mdr_row(row):
+    # Same filters as isolate_mdr, applied to each MDR row while it is read so irrelevant rows are never kept.
+    return (row["latest"] in TRUE_VALUES
+            and isinstance(row["f_ver"], str) and 'Volume 3' in row["f_ver"]
+            and row["library"] in ('Core', 'Efficacy')
+            and row["mandatory_to_be_collected"] in TRUE_VALUES)
+
+def relevant_mdr_rows(df):
+    # is_relevant_mdr_row for a whole DataFrame of raw values at once. Returns a boolean mask.
+    return (df["latest"].isin(TRUE_VALUES)
+            & df["f_ver"].str.contains('Volume 3', regex=False, na=False)
+            & df["library"].isin(['Core', 'Efficacy'])
+            & df["mandatory_to_be_collected"].isin(TRUE_VALUES))
+
+def isolate_mdr(mdr_df, rcc_df, form_matches=None):
+    # Function to only get relevant forms for specific RCC study from MDR since MDR has ALL forms.
+    
+    # Isolate the items to compare from MDR.
+    mdr_df = mdr_df[mdr_df["latest"] == True] # Only items that are the latest
+    mdr_df = mdr_df[mdr_df['f_ver'].str.contains('Volume 3')]
+    mdr_df = mdr_df[(mdr_df['library'] == 'Core') | (mdr_df['library'] == 'Efficacy')]
+    mdr_df = mdr_df[mdr_df["mandatory_to_be_collected"] == True]
+    mdr_df = mdr_df[["f_ver","mdes_form_name", "mde_name", "item_refname", "crf_collection_guidance", "mandatory_to_be_collected", "mde_is_cond_reqd"]]
+
+    # Get the most up to date version of each item. Sort by descending to search longer names first.
+    #mdr_df = mdr_df.sort_values('s_ver', ascending=False).drop_duplicates(["mdes_form_name","item_refname"])
+    mdr_df = mdr_df.sort_values("mdes_form_name", ascending = False)
+
+    # Get only the relevant forms and items.
+    if form_matches is None:
+        form_matches = match_rcc_forms(mdr_df["mdes_form_name"], rcc_df)
+    present_forms = {form for matches in form_matches.values() for form in matches} # Every MDR form that at least one RCC Form starts with.
+    mdr_df['Form Present in RCC Build'] = np.nan
+    mdr_df['Form Present in RCC Build'] = mdr_df["mdes_form_name"].where(mdr_df["mdes_form_name"].isin(present_forms), False) # Keep the form if an RCC Form starts with it.
+    mdr_df = mdr_df[mdr_df['Form Present in RCC Build'] != False] # Removes any forms that were not found in RCC export.
+    return mdr_df
+
+class PrefixIndex:
+    """
+    Longest-prefix lookup over a fixed set of MDR names.
+
+    Names are bucketed by length, so resolving a value only tests the prefixes of that
+    value which could be a name, longest first. A longer match is more exact (ex: AE001 vs. AE001_1).
+
+    Args:
+        names (iterable of str): The MDR form or item names to match against.
+    """
+    def __init__(self, names):
+        self.names = set(names)
+        self.lengths = sorted({len(name) for name in self.names}, reverse=True)
+
+    def longest(self, value):
+        # Returns the longest name that value starts with, or NaN if none match.
+        if not isinstance(value, str):
+            return np.nan
+        for length in self.lengths:
+            if length <= len(value) and value[:length] in self.names:
+                return value[:length]
+        return np.nan
+
+    def matches(self, value):
+        # Returns every name that value starts with, longest first.
+        if not isinstance(value, str):
+            return []
+        return [value[:length] for length in self.lengths if length <= len(value) and value[:length] in self.names]
+
+    def resolve(self, values):
+        # Resolves a whole column in one pass. Each unique value is only looked up once.
+        lookup = {value: self.longest(value) for value in pd.unique(values)}
+        return values.map(lookup)
+
+def match_rcc_forms(mdr_forms, rcc_df):
+    """
+    Matches each unique RCC Form against the MDR form names in a single pass.
+
+    The result is shared by isolate_mdr (which MDR forms are present) and map_rcc_formnames
+    (which MDR form each RCC Form maps to), so the RCC side is only scanned once per comparison.
+
+    Args:
+        mdr_forms (iterable or PrefixIndex): MDR form names, or an index already built over them with mdr_form_index. Non-string values are ignored.
+        rcc_df (pd.DataFrame): RCC export with the 'RefName Path' column already reduced to the form.
+
+    Returns:
+        dict: Unique RCC Form -> list of MDR forms it starts with, longest first.
+    """
+    index = mdr_forms if isinstance(mdr_forms, PrefixIndex) else mdr_form_index(mdr_forms)
+    return {form: index.matches(form) for form in pd.unique(rcc_df["RefName Path"])}
+
+def mdr_form_index(mdr_forms):
+    # Index over the MDR form names. Can be built once and reused for many RCC exports against the same MDR.
+    return PrefixIndex(form for form in set(mdr_forms) if isinstance(form, str))
+
+def map_rcc_formnames(relevant_forms, rcc_df, form_matches=None):
+    if form_matches is None:
+        df = PrefixIndex(relevant_forms).resolve(rcc_df["RefName Path"]) # Longest MDR form name each RCC Form starts with. (ex: AE001 vs. AE001_1)
+    else:
+        relevant_forms = set(relevant_forms)
+        lookup = {form: next((match for match in matches if match in relevant_forms), np.nan) for form, matches in form_matches.items()} # Matches are longest first, so the first relevant one wins.
+        df = rcc_df["RefName Path"].map(lookup)
+    df = pd.DataFrame(df.rename('mdes_form_name'))
+    return df
+
+def map_rcc_itemnames(relevant_vars, rcc_df):
+    df_vars = PrefixIndex(relevant_vars).resolve(rcc_df["Variable Name"]) # Longest MDR item name each RCC item starts with.
+    df_vars = pd.DataFrame(df_vars.rename("item_refname"))
+    return df_vars
+
+def intern_columns(*columns, sort=False):
+    # Factorizes several columns together into categoricals with one shared dtype, so merges between them compare integer codes.
+    # Each value is hashed once; NaN stays missing. sort=True orders the categories, so sorting by codes sorts the strings.
+    codes, uniques = pd.factorize(pd.concat(columns, ignore_index=True), sort=sort)
+    dtype = pd.CategoricalDtype(uniques)
+    bounds = np.cumsum([0] + [len(column) for column in columns])
+    return [pd.Series(pd.Categorical.from_codes(codes[start:end], dtype=dtype), index=column.index, name=column.name)
+            for column, start, end in zip(columns, bounds[:-1], bounds[1:])]
+
+def intern_names(rcc_df, mdr_df):
+    """
+    Interns the names the rest of the comparison sorts, deduplicates and merges on into integer-coded categories.
+
+    Form and item names share one dtype between the RCC and MDR frames, so merges compare codes, and each
+    distinct name (or MDR guidance text) is stored once however many rows refer to it. RCC Forms get sorted
+    categories, so sorting by them gives the same order as sorting the strings.
+
+    Args:
+        rcc_df (pd.DataFrame): Mapped RCC export, with 'mdes_form_name' and 'item_refname'.
+        mdr_df (pd.DataFrame): Relevant MDR rows from isolate_mdr.
+
+    Returns:
+        tuple: (rcc_df, mdr_df) with categorical name columns. The values themselves are unchanged.
+    """
+    rcc_forms, mdr_forms = intern_columns(rcc_df["mdes_form_name"], mdr_df["mdes_form_name"])
+    rcc_items, mdr_items = intern_columns(rcc_df["item_refname"], mdr_df["item_refname"])
+    (rcc_paths,) = intern_columns(rcc_df["RefName Path"], sort=True)
+    (guidance,) = intern_columns(mdr_df["crf_collection_guidance"])
+    rcc_df = rcc_df.assign(**{"RefName Path": rcc_paths, "mdes_form_name": rcc_forms, "item_refname": rcc_items})
+    mdr_df = mdr_df.assign(mdes_form_name=mdr_forms, item_refname=mdr_items, crf_collection_guidance=guidance)
+    return rcc_df, mdr_df
+
+def create_fake_study(rcc_df, mdr_df):
+    # Creates list of mandatory elements using names from RCC.
+    mandatory_df = rcc_df[["RefName Path","mdes_form_name"]].drop_duplicates() # Gives a list that maps RCC Forms to MDR Form Names
+    mandatory_df = mandatory_df.sort_values("RefName Path", kind="stable") # In RCC Form order; within a form, in export order.
+    mdr_df = mdr_df[mdr_df["mandatory_to_be_collected"] == True] # Keep only mandatory fields for this fake study
+    mandatory_df = mandatory_df.merge(mdr_df, how = 'inner', on=['mdes_form_name']) # Merge MDR onto the mandatory df where the MDR names match
+    mandatory_df = mandatory_df[['RefName Path', 'item_refname',"crf_collection_guidance", "mde_is_cond_reqd"]] # Keep only relevant columns.
+    # 'RefName Path', 'item_refname',"crf_collection_guidance"
+    # AE001            AESCAT            instruction
+    # AE001_1          AESCAT            instruction 
+    # Example row where first column is the RCC create event, the second column is the mandatory fields associated, and the last column is any context.
+    return mandatory_df
+
+def return_missing_fields(rcc_df, mandatory_df):
+    final_df = mandatory_df.merge(rcc_df[["RefName Path", "item_refname", "Variable Name"]],how = 'left', on=["RefName Path", "item_refname"]) # Merge export where RCC Form names and MDR item names match.
+    final_df = final_df[final_df['Variable Name'].isnull()] # Variable name is RCC item name, if it's null, then a mandatory field is missing.
+    final_df = final_df.astype({"RefName Path": object, "item_refname": object, "crf_collection_guidance": object}) # Back to plain strings for the output.
+    final_df['Type'] = np.where(final_df["mde_is_cond_reqd"] == True, "Optionally Required", "Mandatory").astype(object)
+    # Inserts description of error. Built only for the missing rows, in one vectorized pass.
+    final_df.insert(loc=3, column='Description', value=final_df['item_refname'].astype(str) + " is marked as " + final_df['Type'] + " in the MDR Repository; however, it is not being collected in " + final_df['RefName Path'].astype(str) + ".")
+    final_df = final_df.rename(columns={'RefName Path': 'Form Name', 'item_refname': 'Item', "crf_collection_guidance":'Context'})
+    final_df = final_df[['Form Name', 'Item', 'Type', 'Description','Context']]
+    return final_df
+
+def compare_files(rcc,mdr,form_index=None,profile=None) -> pd.DataFrame:
+    # rcc and mdr are either file paths or already loaded 'Item' / 'Data' sheets (ex: from workbook_cache).
+    # form_index is an optional mdr_form_index over the same MDR, for comparing many studies against it.
+    # profile is an optional mdr_profile.Profile to record the time, memory and rows of each stage in.
+    # Full print option used for development.
+    pd.set_option("display.max_rows", None, "display.max_columns", None)
+    profile = profile or Profile(memory=False)
+
+    rcc_df, mdr_df = map_study(rcc, mdr, form_index, profile)
+    
+    # Create a fake study of mandatory items using a list of RCC forms from the export. This captures all duplicates of the same forms (DM001 and DM001_1: means two sets of DM001 forms, not just presence of DM001 forms)
+    with profile.stage("create_fake_study", len(rcc_df)) as stage:
+        mandatory_df = create_fake_study(rcc_df, mdr_df)
+        stage["Rows Out"] = len(mandatory_df)
+    
+    # Compares what is found in the required fields df just made to actual study.
+    with profile.stage("return_missing_fields", len(mandatory_df)) as stage:
+        missing_df = return_missing_fields(rcc_df, mandatory_df)
+        stage["Rows Out"] = len(missing_df)
+    return missing_df
+
+def map_study(rcc, mdr, form_index=None, profile=None):
+    # Reads both files and maps the RCC Forms and items to their MDR names.
+    # Returns the mapped RCC export and the MDR rows relevant to this study. Arguments are as for compare_files.
+    profile = profile or Profile(memory=False)
+    # Make user-provided files into dataframes.
+    if isinstance(mdr, pd.DataFrame):
+        mdr_df = mdr
+    else:
+        with profile.stage("read_mdr") as stage:
+            mdr_df = read_sheet(mdr, "Data", profile.progress)
+            stage["Rows Out"] = len(mdr_df)
+    if isinstance(rcc, pd.DataFrame):
+        rcc_df = rcc
+    else:
+        with profile.stage("read_rcc") as stage:
+            rcc_df = read_sheet(rcc, "Item", profile.progress)
+            stage["Rows Out"] = len(rcc_df)
+
+    # Get relevant dataframe from export metadata.
+    rcc_df = rcc_df[["RefName Path","Variable Name"]]
+    rcc_df['RefName Path'] = rcc_df['RefName Path'].str.split(' >> ').str[0] # Isolates Form from rest of path in metadata.
+
+    # Match the RCC Forms against the MDR forms once; used for both the presence filter and the form mapping.
+    with profile.stage("isolate_mdr", len(mdr_df)) as stage:
+        form_matches = match_rcc_forms(mdr_df["mdes_form_name"] if form_index is None else form_index, rcc_df)
+        mdr_df = isolate_mdr(mdr_df, rcc_df, form_matches)
+        stage["Rows Out"] = len(mdr_df)
+
+    # Get list of forms and variables from MDR.
+    relevant_forms = sorted(set(mdr_df["mdes_form_name"]), reverse = True) # Set gives a list of unique items (removes dups), sorted Z-A to get longer strings first
+    relevant_vars = sorted(set(mdr_df["item_refname"].astype("str")), reverse=True)
+    
+    # Create a df that maps RCC export Form Names to their MDR form Names
+    with profile.stage("map_rcc_formnames", len(rcc_df)) as stage:
+        mapped_rcc_formnames = map_rcc_formnames(relevant_forms, rcc_df, form_matches)
+        rcc_df = rcc_df.merge(mapped_rcc_formnames['mdes_form_name'], how='outer', left_index=True, right_index=True) # Merge MDR Form names onto RCC metadata export
+        stage["Rows Out"] = int(rcc_df['mdes_form_name'].notna().sum()) # Rows whose Form was found in the MDR.
+
+    # Create a df that maps RCC export Item Names to their MDR item Names   
+    with profile.stage("map_rcc_itemnames", len(rcc_df)) as stage:
+        mapped_rcc_itemnames = map_rcc_itemnames(relevant_vars, rcc_df)
+        rcc_df = rcc_df.merge(mapped_rcc_itemnames['item_refname'], how='outer', left_index=True, right_index=True).dropna(axis=0) # Merge MDR item names onto RCC metadata export. Drop any forms that don't exist in MDR.
+        stage["Rows Out"] = len(rcc_df)
+
+    with profile.stage("intern_names", len(rcc_df) + len(mdr_df)) as stage:
+        rcc_df, mdr_df = intern_names(rcc_df, mdr_df)
+        stage["Rows Out"] = len(rcc_df) + len(mdr_df)
+    return rcc_df, mdr_df
+
+def read_sheet(filename, sheetname, progress=None):
+    # Reads the RCC 'Item' sheet or the MDR 'Data' sheet, keeping only the columns (and for the MDR, the rows) the comparison uses.
+    # progress is an optional callback for the number of rows read so far (see read_columns).
+    if sheetname == "Data":
+        return snapshot_cache.load(filename, partial(read_mdr, progress=progress))
+    return read_columns(filename, sheetname, RCC_COLUMNS, progress=progress)
+
+def read_mdr(filename, progress=None):
+    return read_columns(filename, "Data", MDR_COLUMNS, is_relevant_mdr_row, progress=progress, frame_filter=relevant_mdr_rows)
+
+def check_file_for_sheet(sheetname, filename):
+    return sheetname in read_sheet_names(filename) # Only reads the workbook manifest.
+
+def check_file_for_filter(sheetname, filename):
+    return read_auto_filter(filename, sheetname) # Filtered range, or None.
+
+def remove_filter(sheetname, filename):
+    wb = op.load_workbook(filename)
+    ws = wb[sheetname]
+    ws.auto_filter.ref = None
+    wb.save(filename)
+    return True
+
+def check_file_for_col(colnames, filename, sheetname):
+    header = read_header(filename, sheetname) # Only reads the first row of the sheet.
+    for colname in colnames:
+        if colname not in header:
+            return colname
+    return True
+
+# pandas' to_excel header style, so streamed workbooks look the same as before.
+HEADER_FONT = Font(bold=True)
+HEADER_BORDER = Border(left=Side(style="thin"), right=Side(style="thin"), top=Side(style="thin"), bottom=Side(style="thin"))
+HEADER_ALIGNMENT = Alignment(horizontal="center", vertical="top")
+EXPORT_CHUNK_ROWS = 10000
+
+def _header_cell(ws, value):
+    cell = WriteOnlyCell(ws, value=value)
+    cell.font = HEADER_FONT
+    cell.border = HEADER_BORDER
+    cell.alignment = HEADER_ALIGNMENT
+    return cell
+
+def _stream_sheet(wb, title, df, extra_columns=()):
+    # Appends df to a write-only sheet a chunk at a time, so only one chunk is ever converted in memory.
+    ws = wb.create_sheet(title)
+    ws.freeze_panes = "B2"
+    ws.append([_header_cell(ws, col) for col in list(df.columns) + list(extra_columns)])
+    blanks = [None] * len(extra_columns)
+    for start in range(0, len(df), EXPORT_CHUNK_ROWS):
+        chunk = df.iloc[start:start + EXPORT_CHUNK_ROWS]
+        for row in chunk.astype(object).where(chunk.notna(), None).to_numpy().tolist(): # NaN is written as an empty cell, like to_excel.
+            ws.append(row + blanks)
+
+def write_output(df, filename, mdr_filename, now=None, changes=None, formats=(), profile=None):
+    """
+    Writes a comparison result to an .xlsx file with an 'Output' sheet and an 'Info' sheet.
+
+    The workbook is streamed with openpyxl's write-only mode, so memory use does not grow with the
+    number of cells the way a full openpyxl workbook does. df is neither modified nor copied whole.
+
+    Args:
+        df (pd.DataFrame): Result of compare_files. It is not modified.
+        filename (str): Path of the workbook to write.
+        mdr_filename (str): Path of the MDR file used, for the MDR date on the 'Info' sheet.
+        now (datetime): Run date for the 'Info' sheet. Defaults to now.
+        changes (pd.DataFrame): Optional. Changes since the last run (from compare_incremental), written to a 'Changes' sheet.
+        formats (iterable): Optional. Also write the result as 'csv' and/or 'parquet' next to the workbook, with the same name.
+        profile (Profile): Optional. Stage timings of the run, added to the 'Info' sheet below the dates.
+
+    Returns:
+        list: Paths of the files written, the workbook first.
+    """
+    now = now or datetime.now()
+    mdr_date = MDR_DATE.findall(os.path.basename(mdr_filename))
+    info = [
+        ("Tool Run Date", now.strftime('%b %d %Y')),
+        ("MDR File Date", mdr_date[0].replace('_', ' ') if mdr_date else "Unknown"),
+    ]
+
+    wb = Workbook(write_only=True)
+    _stream_sheet(wb, 'Output', df, extra_columns=["Builder Comments"]) # Blank column for the builder's notes.
+    ws = wb.create_sheet('Info')
+    for label, value in info:
+        ws.append([_header_cell(ws, label), value])
+    if profile is not None:
+        ws.append([])
+        ws.append([_header_cell(ws, col) for col in profile.columns])
+        for row in profile.rows():
+            ws.append(row)
+    if changes is not None:
+        _stream_sheet(wb, 'Changes', changes)
+    wb.save(filename)
+    written = [filename]
+
+    stem = os.path.splitext(filename)[0]
+    for fmt in formats:
+        if fmt == "csv":
+            df.to_csv(stem + ".csv", index=False, chunksize=EXPORT_CHUNK_ROWS)
+        elif fmt == "parquet":
+            df.to_parquet(stem + ".parquet", index=False) # Needs pyarrow.
+        else:
+            raise ValueError(f"Unknown export format '{fmt}'. Use 'csv' or 'parquet'.")
+        written.append(stem + "." + fmt)
+    return written
@@ -0,0 +1,142 @@
+import hashlib
+import os
+import numpy as np
+import pandas as pd
+from mdr_engine import map_study, create_fake_study, return_missing_fields, read_sheet
+from mdr_snapshot import default_cache_dir, file_hash
+from workbook_io import read_header, read_sheet_names
+
+# Incremental re-comparison. The result of each run is saved per study together with a fingerprint of every
+# MDR form: its MDR rows and the RCC rows mapped to it. The next run only recomputes the forms whose
+# fingerprint changed and reuses the saved rows for the rest, then reports what changed since the last run.
+# When neither file changed since the last run, the saved result is returned without reading either of them,
+# and when only the MDR changed, the RCC rows saved with the run are used instead of reading the export again.
+
+STATE_VERSION = 2 # Bump when the saved state or the comparison changes, so old state is not reused.
+RESULT_COLUMNS = ['Form Name', 'Item', 'Type', 'Description', 'Context']
+
+def default_state_dir():
+    return os.path.join(os.path.dirname(default_cache_dir()), "runs")
+
+def study_key(rcc):
+    """
+    Name of the study an RCC export belongs to, so a newer export of the same study picks up the last run.
+
+    Args:
+        rcc (str): Path to the RCC metadata export.
+
+    Returns:
+        str: The study name from the 'Study Information' sheet, or the file name if it has none.
+    """
+    try:
+        if "Study Information" in read_sheet_names(rcc):
+            header = read_header(rcc, "Study Information") # First row is 'Study Name', <name>.
+            if len(header) > 1 and header[0] == "Study Name" and header[1]:
+                return str(header[1])
+    except Exception:
+        pass
+    return os.path.splitext(os.path.basename(rcc))[0]
+
+def frame_key(df):
+    # Content hash of an already loaded MDR, for when there is no file to hash.
+    return hashlib.sha1(pd.util.hash_pandas_object(df, index=False).values.tobytes()).hexdigest()
+
+def form_fingerprints(rcc_df, mdr_df):
+    """
+    Fingerprints every MDR form from the rows that decide its result.
+
+    Args:
+        rcc_df (pd.DataFrame): Mapped RCC export from map_study.
+        mdr_df (pd.DataFrame): Relevant MDR rows from map_study.
+
+    Returns:
+        dict: mdes_form_name -> fingerprint string.
+    """
+    def by_form(df):
+        # Row order is not part of the fingerprint: isolate_mdr's sort can reorder a form's rows when other forms change.
+        hashes = pd.util.hash_pandas_object(df.astype(str), index=False)
+        return {form: hashlib.sha1(np.sort(group.values).tobytes()).hexdigest() for form, group in hashes.groupby(df["mdes_form_name"].values, sort=False, observed=True)}
+    mdr_fingerprints = by_form(mdr_df)
+    rcc_fingerprints = by_form(rcc_df[["RefName Path", "Variable Name", "mdes_form_name", "item_refname"]])
+    return {form: mdr_fingerprints.get(form, '') + rcc_fingerprints.get(form, '') for form in set(mdr_fingerprints) | set(rcc_fingerprints)}
+
+def _missing_fields(rcc_df, mdr_df, forms):
+    # Runs the comparison for only the given MDR forms, tagging each row with its MDR form.
+    rcc_df = rcc_df[rcc_df["mdes_form_name"].isin(forms)]
+    mdr_df = mdr_df[mdr_df["mdes_form_name"].isin(forms)]
+    missing_df = return_missing_fields(rcc_df, create_fake_study(rcc_df, mdr_df))
+    form_of = dict(zip(rcc_df["RefName Path"], rcc_df["mdes_form_name"])) # Each RCC Form maps to one MDR form.
+    return missing_df.assign(mdes_form_name=missing_df["Form Name"].map(form_of))
+
+def _order(df):
+    # Same row order as compare_files: by RCC Form, then MDR order within the form.
+    return df.sort_values("Form Name", kind="stable").reset_index(drop=True)
+
+def compare_incremental(rcc, mdr, state_dir=None, form_index=None, mdr_key=None):
+    """
+    Compares an RCC export against the MDR, recomputing only the forms that changed since this study's last run.
+
+    Args:
+        rcc (str): Path to the RCC metadata export.
+        mdr (str or pd.DataFrame): Path to the MDR file, or its already loaded 'Data' sheet.
+        state_dir (str): Folder for the saved runs. Defaults to a 'runs' folder next to the MDR snapshots.
+        form_index (PrefixIndex): Optional mdr_form_index over the same MDR.
+        mdr_key (str): Optional content hash of the MDR (file_hash of its file), so a loaded MDR doesn't have to be hashed again.
+
+    Returns:
+        tuple: (result, changes, recomputed). result is the full result: the same rows as compare_files, with a fresh index.
+            Rows of forms that did not change keep the order they had when they were computed.
+            changes lists the rows that are new or resolved since the last run, with a 'Change' column.
+            recomputed is the list of MDR forms that had to be compared again.
+    """
+    state_dir = state_dir or default_state_dir()
+    state_path = os.path.join(state_dir, hashlib.sha1(study_key(rcc).encode()).hexdigest() + ".pkl")
+    previous = None
+    if os.path.exists(state_path):
+        try:
+            previous = pd.read_pickle(state_path)
+            if previous.get("version") != STATE_VERSION:
+                previous = None
+        except Exception as e:
+            print(f"Ignoring unreadable saved run {state_path}: {e}")
+
+    rcc_hash = file_hash(rcc)
+    mdr_key = mdr_key or (frame_key(mdr) if isinstance(mdr, pd.DataFrame) else file_hash(mdr))
+    if previous is not None and previous["rcc_hash"] == rcc_hash and previous["mdr_key"] == mdr_key:
+        # Same export against the same MDR: nothing can have changed.
+        return previous["result"][RESULT_COLUMNS], pd.DataFrame(columns=["Change"] + RESULT_COLUMNS), []
+    # Only the MDR changed: the export's rows were saved with the last run, so it needn't be read again.
+    rcc_rows = previous["rcc_rows"] if previous is not None and previous["rcc_hash"] == rcc_hash else read_sheet(rcc, "Item")
+
+    rcc_df, mdr_df = map_study(rcc_rows, mdr, form_index)
+    fingerprints = form_fingerprints(rcc_df, mdr_df)
+    if previous is None:
+        recomputed = sorted(fingerprints)
+        result = _missing_fields(rcc_df, mdr_df, recomputed)
+        kept = result.iloc[0:0]
+    else:
+        recomputed = sorted(form for form, fingerprint in fingerprints.items() if previous["fingerprints"].get(form) != fingerprint)
+        kept = previous["result"][previous["result"]["mdes_form_name"].isin(set(fingerprints) - set(recomputed))]
+        result = pd.concat([kept, _missing_fields(rcc_df, mdr_df, recomputed)], ignore_index=True)
+    result = _order(result)
+
+    # Only recomputed (or removed) forms can have changed.
+    new_rows = result[~result["mdes_form_name"].isin(kept["mdes_form_name"])]
+    old_rows = previous["result"][~previous["result"]["mdes_form_name"].isin(kept["mdes_form_name"])] if previous is not None else result.iloc[0:0]
+    keys = ['Form Name', 'Item', 'Type']
+    changes = pd.concat([
+        new_rows.merge(old_rows[keys].drop_duplicates(), on=keys, how="left", indicator=True).query("_merge == 'left_only'").assign(Change="New"),
+        old_rows.merge(new_rows[keys].drop_duplicates(), on=keys, how="left", indicator=True).query("_merge == 'left_only'").assign(Change="Resolved"),
+    ], ignore_index=True)
+    changes = _order(changes)[["Change"] + RESULT_COLUMNS]
+
+    os.makedirs(state_dir, exist_ok=True)
+    temp = f"{state_path}.{os.getpid()}.tmp" # Per process, as the same study can be compared by two at once (ex: batch and watch mode).
+    try:
+        pd.to_pickle({"version": STATE_VERSION, "study": study_key(rcc), "fingerprints": fingerprints, "result": result,
+                      "rcc_hash": rcc_hash, "mdr_key": mdr_key, "rcc_rows": rcc_rows}, temp)
+        os.replace(temp, state_path)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+    return result[RESULT_COLUMNS], changes, recomputed
@@ -0,0 +1,176 @@
+import argparse
+import cProfile
+import json
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Per-stage instrumentation for compare_files: wall time, peak memory and row counts in and out of each stage.
+# Pass a Profile to compare_files to fill it in. From a script, the stages can also be saved as JSON and the
+# whole run as a cProfile file:
+#
+#   py mdr_profile.py study_export.xlsx MDR_RCC_metadata_Apr_23_2025.xlsx --json stages.json --cprofile run.prof
+
+def process_peak_mb():
+    """
+    The most memory this process has held so far (its peak resident set / working set), which the OS keeps
+    track of anyway, so reading it costs nothing like tracemalloc.
+
+    Returns:
+        float: Megabytes, or None if it can't be read on this platform.
+    """
+    try:
+        if sys.platform == "win32":
+            import ctypes
+            from ctypes import wintypes
+            class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+                _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [(name, ctypes.c_size_t) for name in (
+                    "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                    "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+            kernel32 = ctypes.WinDLL("kernel32")
+            kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+            kernel32.K32GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.POINTER(PROCESS_MEMORY_COUNTERS), wintypes.DWORD]
+            counters = PROCESS_MEMORY_COUNTERS()
+            counters.cb = ctypes.sizeof(counters)
+            if not kernel32.K32GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+                return None
+            peak = counters.PeakWorkingSetSize
+        else:
+            import resource
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            peak = peak if sys.platform == "darwin" else peak * 1024 # Bytes on macOS, kilobytes elsewhere.
+    except (ImportError, AttributeError, OSError):
+        return None
+    return round(peak / 1024 / 1024, 1)
+
+class Profile:
+    """
+    Records the stages of one comparison run.
+
+    Args:
+        memory (bool or str): True records the peak memory each stage needed with tracemalloc, which slows the run
+            down somewhat. 'process' records the process's peak memory so far at the end of each stage instead
+            (see process_peak_mb), which is free but includes whatever the process held before the stage; use it
+            in a process of its own, such as mdr_worker's. False leaves memory out, and the Peak MB column with it.
+        cprofile (bool): Also run cProfile over the stages, for dump_stats.
+        on_event (callable): Optional. Called with a dict when a stage starts ('stage'), reports progress
+            ('progress', with the rows handled so far) and ends ('stage_done', with the stage's record).
+    """
+    all_columns = ["Stage", "Seconds", "Peak MB", "Rows In", "Rows Out"]
+
+    def __init__(self, memory=True, cprofile=False, on_event=None):
+        self.memory = memory
+        self.stages = []
+        self.profiler = cProfile.Profile() if cprofile else None
+        self.on_event = on_event
+        self.current = None
+
+    @property
+    def columns(self):
+        # Columns of rows(). Peak MB is only there if memory is recorded.
+        return self.all_columns if self.memory else [col for col in self.all_columns if col != "Peak MB"]
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        """
+        Times the code in a with block as one stage.
+
+        Args:
+            name (str): Stage name, ex: 'isolate_mdr'.
+            rows_in (int): Rows going into the stage.
+
+        Yields:
+            dict: The stage's record. Set its 'Rows Out' before the block ends.
+        """
+        record = {"Stage": name, "Seconds": None, "Peak MB": None, "Rows In": rows_in, "Rows Out": None}
+        self.current = name
+        self.emit({"event": "stage", "stage": name, "rows_in": rows_in})
+        tracing = self.memory is True
+        started_tracing = tracing and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if tracing:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        if self.profiler:
+            self.profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["Seconds"] = round(time.perf_counter() - start, 4)
+            if self.profiler:
+                self.profiler.disable()
+            if tracing:
+                # Memory the stage needed on top of what was already allocated when it started.
+                record["Peak MB"] = round((tracemalloc.get_traced_memory()[1] - baseline) / 1024 / 1024, 1)
+                if started_tracing:
+                    tracemalloc.stop()
+            elif self.memory:
+                record["Peak MB"] = process_peak_mb()
+            self.stages.append(record)
+            self.current = None
+            self.emit({"event": "stage_done", "stage": name, "record": record})
+
+    def emit(self, event):
+        if self.on_event is not None:
+            self.on_event(event)
+
+    def progress(self, rows):
+        # Reports how many rows the current stage has handled so far.
+        self.emit({"event": "progress", "stage": self.current, "rows": rows})
+
+    def total_seconds(self):
+        return round(sum(record["Seconds"] for record in self.stages), 4)
+
+    def rows(self):
+        # One list per stage, in the order of Profile.columns, plus a total row.
+        peaks = [record["Peak MB"] for record in self.stages if record["Peak MB"] is not None]
+        total = {"Stage": "Total", "Seconds": self.total_seconds(), "Peak MB": max(peaks) if peaks else None, "Rows In": None, "Rows Out": None}
+        return [[record[col] for col in self.columns] for record in self.stages + [total]]
+
+    def summary(self):
+        lines = []
+        for row in self.rows():
+            row = dict(zip(self.columns, row))
+            peak, rows_in, rows_out = row.get("Peak MB"), row["Rows In"], row["Rows Out"]
+            lines.append(f"{row['Stage']:<22} {row['Seconds']:>9.3f}s {'' if peak is None else f'{peak:>8.1f} MB'} {'' if rows_in is None else rows_in:>9} -> {'' if rows_out is None else rows_out}")
+        return "\n".join(lines)
+
+    def to_json(self, path):
+        with open(path, "w") as f:
+            json.dump({"stages": self.stages, "total_seconds": self.total_seconds()}, f, indent=2)
+
+    def dump_stats(self, path):
+        # Writes the cProfile stats, for pstats or snakeviz. Needs Profile(cprofile=True).
+        if self.profiler is None:
+            raise ValueError("Profile was created without cprofile=True.")
+        self.profiler.dump_stats(path)
+
+    def __getstate__(self):
+        # cProfile.Profile and event callbacks can't always be pickled. Drop them so a Profile can come back from a worker process.
+        state = self.__dict__.copy()
+        state["profiler"] = None
+        state["on_event"] = None
+        return state
+
+if __name__ == "__main__":
+    from mdr_engine import compare_files
+
+    parser = argparse.ArgumentParser(description="Run one comparison and report the time, memory and rows of each stage.")
+    parser.add_argument("rcc", help="RCC metadata export.")
+    parser.add_argument("mdr", help="MDR file.")
+    parser.add_argument("--json", help="Save the stages as JSON.")
+    parser.add_argument("--cprofile", help="Save a cProfile of the run.")
+    parser.add_argument("--no-memory", action="store_true", help="Don't track memory, for the most accurate timings.")
+    args = parser.parse_args()
+
+    profile = Profile(memory=not args.no_memory, cprofile=bool(args.cprofile))
+    result = compare_files(args.rcc, args.mdr, profile=profile)
+    print(profile.summary())
+    print(f"{len(result)} missing field(s).")
+    if args.json:
+        profile.to_json(args.json)
+    if args.cprofile:
+        profile.dump_stats(args.cprofile)
@@ -0,0 +1,184 @@
+import argparse
+import hashlib
+import importlib.util
+import os
+import re
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+# On-disk snapshots of the filtered MDR 'Data' sheet. The MDR export changes at most daily, so the first
+# comparison against a new MDR pays for reading the .xlsx and later ones load the snapshot instead.
+
+SNAPSHOT_VERSION = 1 # Bump when the columns or filters read from the MDR change, so old snapshots are not reused.
+MDR_DATE = re.compile(r'(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)_\d{2}_\d{4}')
+
+def default_cache_dir():
+    # Per-user cache folder: %LOCALAPPDATA% on Windows, ~/.cache elsewhere.
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "MDRComparisonTool", "snapshots")
+
+def file_hash(filename):
+    # SHA-256 of the file contents, so a renamed or re-downloaded copy of the same MDR still hits.
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def mdr_date(filename):
+    # 'MDR_RCC_metadata_Apr_23_2025.xlsx' -> 'Apr_23_2025', or None if the name has no date.
+    match = MDR_DATE.findall(os.path.basename(filename))
+    return match[0] if match else None
+
+class SnapshotCache:
+    """
+    Size-bounded folder of MDR snapshots, keyed by the MDR's content hash and the date in its file name.
+
+    Snapshots are written as Parquet when pyarrow is installed and as pickles otherwise. When the folder
+    grows past max_bytes, the least recently used snapshots are deleted.
+
+    Args:
+        directory (str): Folder to keep snapshots in. Defaults to default_cache_dir().
+        max_bytes (int): Total size the folder may use.
+    """
+    def __init__(self, directory=None, max_bytes=500 * 1024 * 1024):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.extension = ".parquet" if importlib.util.find_spec("pyarrow") is not None else ".pkl"
+
+    def path(self, filename, content_hash=None, extension=None):
+        content_hash = content_hash or file_hash(filename)
+        name = f"{mdr_date(filename) or 'undated'}_{content_hash[:32]}_v{SNAPSHOT_VERSION}"
+        return os.path.join(self.directory, name + (extension or self.extension))
+
+    def get(self, filename, content_hash=None):
+        # Returns the snapshot for this MDR file, or None if there isn't one.
+        content_hash = content_hash or file_hash(filename)
+        for extension in dict.fromkeys([self.extension, ".pkl"]): # A pickle if the MDR couldn't be saved as Parquet.
+            path = self.path(filename, content_hash, extension)
+            if not os.path.exists(path):
+                continue
+            try:
+                df = _read(path)
+            except Exception as e:
+                print(f"Discarding unreadable MDR snapshot {path}: {e}")
+                os.remove(path)
+                return None
+            os.utime(path) # Marks it as recently used for eviction.
+            return df
+        return None
+
+    def put(self, filename, df, content_hash=None):
+        # Saves as Parquet when possible and as a pickle otherwise, ex: for a column mixing text and numbers, which pyarrow rejects.
+        os.makedirs(self.directory, exist_ok=True)
+        for extension in dict.fromkeys([self.extension, ".pkl"]):
+            path = self.path(filename, content_hash, extension)
+            temp = f"{path}.{os.getpid()}.tmp" # Per process, as the app's prefetch and a comparison can save the same MDR at once.
+            try:
+                _write(df, temp, extension)
+                os.replace(temp, path) # Never leave a half-written snapshot behind.
+                break
+            except Exception as e:
+                if extension == ".pkl":
+                    raise
+                print(f"Saving MDR snapshot as a pickle, as {extension} failed: {type(e).__name__}: {e}")
+            finally:
+                if os.path.exists(temp):
+                    os.remove(temp)
+        self.evict()
+        return path
+
+    def load(self, filename, read):
+        """
+        Returns the snapshot for an MDR file, creating it with read(filename) on a miss.
+
+        Args:
+            filename (str): Path to the MDR .xlsx file.
+            read (callable): Reads and filters the MDR when there is no snapshot.
+
+        Returns:
+            pd.DataFrame: The filtered MDR.
+        """
+        content_hash = file_hash(filename)
+        df = self.get(filename, content_hash)
+        if df is None:
+            df = read(filename)
+            try:
+                self.put(filename, df, content_hash)
+            except Exception as e:
+                # Without a snapshot the next comparison reads the .xlsx again; this one needn't fail.
+                print(f"Could not save MDR snapshot for {filename}: {type(e).__name__}: {e}")
+        return df
+
+    def read(self, name):
+        # Loads a snapshot by its file name in entries(), ex: for a client picking one of the cached MDRs.
+        if name not in {entry["file"] for entry in self.entries()}:
+            raise FileNotFoundError(f"No cached MDR named '{name}'.")
+        path = os.path.join(self.directory, name)
+        df = _read(path)
+        os.utime(path)
+        return df
+
+    def entries(self):
+        # Snapshots in the folder, most recently used first.
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith((".parquet", ".pkl")):
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            date = MDR_DATE.findall(name)
+            entries.append({
+                "file": name,
+                "mdr_date": date[0].replace('_', ' ') if date else None,
+                "size": stat.st_size,
+                "last_used": datetime.fromtimestamp(stat.st_mtime),
+            })
+        return sorted(entries, key=lambda entry: entry["last_used"], reverse=True)
+
+    def evict(self):
+        total = 0
+        for entry in self.entries():
+            total += entry["size"]
+            if total > self.max_bytes:
+                os.remove(os.path.join(self.directory, entry["file"]))
+
+    def purge(self, mdr_date=None):
+        # Deletes every snapshot, or only those for one MDR date (ex: 'Apr 23 2025'). Returns how many were deleted.
+        removed = 0
+        for entry in self.entries():
+            if mdr_date is None or entry["mdr_date"] == mdr_date:
+                os.remove(os.path.join(self.directory, entry["file"]))
+                removed += 1
+        return removed
+
+def _write(df, path, extension):
+    if extension == ".parquet":
+        df.to_parquet(path, index=False, engine="pyarrow")
+    else:
+        df.to_pickle(path, compression=None)
+
+def _read(path):
+    if path.endswith(".parquet"):
+        # Parquet brings missing values back as None in object columns; pd.read_excel uses NaN.
+        df = pd.read_parquet(path, engine="pyarrow")
+        return df.replace({None: np.nan})
+    return pd.read_pickle(path, compression=None)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or purge the MDR snapshot cache.")
+    parser.add_argument("action", choices=["list", "purge"])
+    parser.add_argument("--date", help="Only purge snapshots for this MDR date, ex: 'Apr 23 2025'.")
+    parser.add_argument("--dir", help="Snapshot folder. Defaults to the per-user cache folder.")
+    args = parser.parse_args()
+
+    cache = SnapshotCache(args.dir)
+    if args.action == "list":
+        entries = cache.entries()
+        print(f"{len(entries)} snapshot(s) in {cache.directory}, {sum(entry['size'] for entry in entries) / 1024 / 1024:.1f} MB")
+        for entry in entries:
+            print(f"  {entry['file']}  MDR {entry['mdr_date'] or 'undated'}  {entry['size'] / 1024:.0f} KB  last used {entry['last_used']:%b %d %Y %H:%M}")
+    else:
+        print(f"Removed {cache.purge(args.date)} snapshot(s) from {cache.directory}.")
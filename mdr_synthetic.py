@@ -0,0 +1,155 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+# Synthetic MDR 'Data' sheets and RCC 'Item' sheets for benchmarking, from a seed so every run sees the same data.
+# Names follow the real files: MDR forms like AE001 (some with their own _1 variant, ex: AE001_1), items like
+# AETERM and AETERM_OTH that prefix each other, and RCC Forms that are copies of an MDR form (AE001_1, AE001_2)
+# or custom forms missing from the MDR. RefName Paths are '<RCC Form> >> <section> >> <item>'.
+#
+#   py mdr_synthetic.py --rows 5000 --out synthetic/
+
+DOMAINS = ["AE", "CM", "DM", "DS", "EC", "EG", "EX", "IE", "LB", "MH", "PE", "QS", "RS", "SV", "TU", "VS"]
+STEMS = ["TERM", "STDAT", "ENDAT", "SEV", "SER", "REL", "ACN", "OUT", "CAT", "SCAT", "ORRES", "ORRESU",
+         "DOSE", "DOSU", "ROUTE", "FREQ", "YN", "SPID", "REFID", "PERF", "REASND", "LOC", "LAT", "METHOD"]
+LIBRARIES = ["Core", "Efficacy", "Safety", "TA"]
+GUIDANCE = [
+    "Collect on every visit.",
+    "Do Not include on the CRF. Defaulted from the SRDM Reftable.",
+    "Only collect when the previous question is answered Yes. Record the date as DD-MMM-YYYY.",
+    "For use when the response is not in the codelist; otherwise leave blank and select from the list provided.",
+]
+
+def item_names(domain, count):
+    # AETERM, AESTDAT, ..., then AETERM_OTH (prefixed by AETERM), then numbered copies like AETERM_002.
+    names = [domain + stem for stem in STEMS]
+    names += [name + "_OTH" for name in names]
+    for k in range(2, count // len(names) + 2):
+        names += [f"{domain}{stem}_{k:03d}" for stem in STEMS]
+    return names[:count]
+
+def make_mdr(n_forms=100, items_per_form=15, seed=0):
+    """
+    Generates an MDR 'Data' sheet.
+
+    About 70% of the rows pass the comparison's filters (latest, Volume 3, Core or Efficacy, mandatory), and
+    every relevant form and item name appears once per form. The older-schema columns (folder, s_ver,
+    mde_design_instruction) are filled in too, so extras/compare_files.py can read it.
+
+    Args:
+        n_forms (int): Number of MDR forms. About 10% more are added as _1 variants of existing forms.
+        items_per_form (int): Average number of items per form.
+        seed (int): Random seed.
+
+    Returns:
+        pd.DataFrame: The MDR, about n_forms * items_per_form * 1.3 rows.
+    """
+    rng = np.random.default_rng(seed)
+    forms = [f"{DOMAINS[i % len(DOMAINS)]}{i // len(DOMAINS) + 1:03d}" for i in range(n_forms)]
+    forms += [form + "_1" for form in rng.choice(forms, size=max(1, n_forms // 10), replace=False)]
+
+    rows = []
+    for form in forms:
+        domain = form[:2]
+        for item in item_names(domain, max(1, int(rng.poisson(items_per_form)))):
+            rows.append((form, item))
+    mdr = pd.DataFrame(rows, columns=["mdes_form_name", "item_refname"])
+    n = len(mdr)
+    volume_3 = rng.random(n) < 0.95
+    mdr["f_ver"] = np.where(volume_3, "Volume 3 - v" + pd.Series(rng.integers(1, 9, n)).astype(str), "Volume 2 - v1")
+    mdr["mde_name"] = mdr["item_refname"].str.title() + " element"
+    mdr["crf_collection_guidance"] = np.array(GUIDANCE + [np.nan], dtype=object)[rng.integers(0, len(GUIDANCE) + 1, n)]
+    mdr["mandatory_to_be_collected"] = rng.random(n) < 0.8
+    mdr["mde_is_cond_reqd"] = mdr["mandatory_to_be_collected"] & (rng.random(n) < 0.2)
+    mdr["library"] = rng.choice(LIBRARIES, size=n, p=[0.6, 0.3, 0.05, 0.05])
+    mdr["latest"] = True
+    mdr["s_ver"] = 2
+
+    # Older versions of some rows, which the latest filter has to drop.
+    older = mdr.sample(frac=0.2, random_state=seed).assign(latest=False, s_ver=1, mandatory_to_be_collected=True)
+    mdr = pd.concat([mdr, older], ignore_index=True).sample(frac=1, random_state=seed).reset_index(drop=True)
+    mdr["folder"] = np.where(mdr["f_ver"].str.contains("Volume 3"), "Volume 3", "Volume 2")
+    mdr["mde_design_instruction"] = mdr["crf_collection_guidance"]
+    return mdr[["f_ver", "folder", "s_ver", "mdes_form_name", "mde_name", "item_refname", "crf_collection_guidance",
+                "mde_design_instruction", "mandatory_to_be_collected", "mde_is_cond_reqd", "latest", "library"]]
+
+def make_rcc(mdr, n_forms=50, missing_rate=0.1, custom_rate=0.05, seed=0):
+    """
+    Generates an RCC 'Item' sheet for a study built from the MDR's forms.
+
+    Args:
+        mdr (pd.DataFrame): MDR from make_mdr.
+        n_forms (int): Number of RCC Forms in the study. Forms used more than once get _1, _2 ... copies.
+        missing_rate (float): Share of each form's MDR items left out of the study.
+        custom_rate (float): Share of forms and items that don't exist in the MDR.
+        seed (int): Random seed.
+
+    Returns:
+        pd.DataFrame: The RCC export.
+    """
+    rng = np.random.default_rng(seed + 1)
+    latest = mdr[mdr["latest"] == True]
+    items_by_form = latest.groupby("mdes_form_name", sort=False)["item_refname"].unique()
+    mdr_forms = items_by_form.index.to_numpy()
+
+    copies = {}
+    rows = []
+    for i in range(n_forms):
+        if rng.random() < custom_rate:
+            form, items = f"ZCUSTOM{i:04d}", [f"ZCUST{k:02d}" for k in range(rng.integers(3, 10))]
+        else:
+            base = mdr_forms[rng.integers(len(mdr_forms))]
+            copies[base] = copies.get(base, -1) + 1
+            form = base if copies[base] == 0 else f"{base}_{copies[base]}" # AE001, AE001_1, AE001_2, ...
+            items = [item for item in items_by_form[base] if rng.random() >= missing_rate]
+            items += [f"{base[:2]}CUSTOM{k}" for k in range(rng.binomial(len(items) + 1, custom_rate))]
+        for item in items:
+            section = "Section 1" if rng.random() < 0.7 else "Section 2"
+            rows.append((f"{form} >> {section} >> {item}", item, f"{item.title()} label"))
+    return pd.DataFrame(rows, columns=["RefName Path", "Variable Name", "Item Label"])
+
+def make_study(rows=5000, seed=0):
+    """
+    Generates a matching MDR and RCC export of about the given size each.
+
+    Args:
+        rows (int): Approximate number of rows in each sheet.
+        seed (int): Random seed.
+
+    Returns:
+        tuple: (rcc, mdr) DataFrames.
+    """
+    mdr = make_mdr(n_forms=max(2, rows // 20), seed=seed)
+    rcc = make_rcc(mdr, n_forms=max(1, rows // 14), seed=seed)
+    return rcc, mdr
+
+def write_sheet(df, filename, sheetname):
+    # Streams a DataFrame to a one-sheet .xlsx, so even millions of rows don't have to fit in an openpyxl workbook.
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(sheetname)
+    ws.append(list(df.columns))
+    for row in df.astype(object).where(df.notna(), None).itertuples(index=False, name=None):
+        ws.append(row)
+    wb.save(filename)
+
+def write_study(rcc, mdr, folder, seed=0):
+    # Writes the study as an RCC export and an MDR file named like the real ones. Returns (rcc path, mdr path).
+    os.makedirs(folder, exist_ok=True)
+    rcc_path = os.path.join(folder, f"synthetic_study_{len(rcc)}_{seed}.xlsx")
+    mdr_path = os.path.join(folder, f"MDR_RCC_metadata_synthetic_{len(mdr)}_{seed}.xlsx")
+    write_sheet(rcc, rcc_path, "Item")
+    write_sheet(mdr, mdr_path, "Data")
+    return rcc_path, mdr_path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic RCC export and MDR file.")
+    parser.add_argument("--rows", type=int, default=5000, help="Approximate number of rows in each file.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    parser.add_argument("--out", default=".", help="Folder to write the two files to.")
+    args = parser.parse_args()
+
+    rcc, mdr = make_study(args.rows, args.seed)
+    rcc_path, mdr_path = write_study(rcc, mdr, args.out, args.seed)
+    print(f"{rcc_path}: {len(rcc)} rows\n{mdr_path}: {len(mdr)} rows")
@@ -0,0 +1,248 @@
+import argparse
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from mdr_batch import compare_study, _init_worker, _summary_row
+from mdr_engine import read_sheet, mdr_form_index, check_file_for_sheet
+from mdr_snapshot import file_hash
+
+# Watch mode: compares every new or changed RCC metadata export dropped into a folder, writing its output
+# workbook next to it. The MDR is read and indexed once and kept loaded in the worker processes, so each
+# export only pays for its own comparison. The folder is polled, so nothing beyond the standard library is needed.
+#
+#   py mdr_watch.py --mdr MDR_RCC_metadata_Apr_23_2025.xlsx //share/builds/exports
+
+OWN_OUTPUTS = ("MDRComparisonOutput_", "MDRComparisonSummary_") # Written by this tool into the same folder; never compared.
+MAX_RETRIES = 1 # Times an export is compared again after its worker process died (ex: out of memory).
+
+def signature(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+class FolderWatcher:
+    """
+    Polls a folder for RCC exports and compares each one once it has stopped changing.
+
+    An export counts as written once its size and modification time have held for settle seconds and it
+    opens as a complete .xlsx, so half-copied files are not picked up. Exports that arrive in a burst are
+    queued for the worker pool; a file that changes again while it is queued or running is compared again afterwards.
+
+    Args:
+        mdr (str): Path to the MDR file. It is loaded again if it changes.
+        folder (str): Folder to watch (not its subfolders).
+        settle (float): Seconds a file must stay unchanged before it is compared.
+        workers (int): Number of worker processes. Defaults to 2.
+        incremental (bool): Only recompute the forms that changed since each study's last run.
+        formats (iterable): Also write each result as 'csv' and/or 'parquet'.
+        existing (bool): Also compare the exports already in the folder when watching starts.
+    """
+    def __init__(self, mdr, folder, settle=5, workers=None, incremental=False, formats=(), existing=False):
+        self.mdr = mdr
+        self.folder = folder
+        self.settle = settle
+        self.workers = workers or 2
+        self.incremental = incremental
+        self.formats = formats
+        self.pool = None
+        self.initargs = None # The loaded MDR for _init_worker, kept to restart the workers.
+        self.mdr_signature = None
+        self.retries = {} # Path -> times it was resubmitted after its worker died.
+        self.changing = {} # Path -> (signature, when it was first seen with it).
+        self.done = {} # Path -> signature it was last compared at.
+        self.running = {} # Future -> (path, signature).
+        if not existing:
+            self.done = {path: signature(path) for path in self.exports()}
+
+    def exports(self):
+        # .xlsx files in the folder that could be RCC exports.
+        paths = []
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                name = entry.name
+                if (entry.is_file() and name.lower().endswith(".xlsx") and not name.startswith("~$") and not name.startswith(OWN_OUTPUTS)
+                        and os.path.abspath(entry.path) != os.path.abspath(self.mdr)):
+                    paths.append(entry.path)
+        return sorted(paths)
+
+    def load_mdr(self):
+        # Starts the worker pool with the MDR loaded and indexed. Restarts it once a changed MDR file has settled
+        # like an export; if the new file can't be read, the loaded MDR stays in use until the file changes again.
+        try:
+            current = signature(self.mdr)
+        except FileNotFoundError:
+            return # Being replaced.
+        if current == self.mdr_signature:
+            return
+        if self.pool is not None and not self.settled(self.mdr, current, time.monotonic()):
+            return
+        start = time.perf_counter()
+        try:
+            mdr_df = read_sheet(self.mdr, "Data")
+            initargs = (mdr_df, mdr_form_index(mdr_df["mdes_form_name"]), file_hash(self.mdr))
+        except Exception as e:
+            if self.pool is None:
+                raise
+            print(f"Could not reload {os.path.basename(self.mdr)}, still using the previous MDR: {type(e).__name__}: {e}", flush=True)
+            self.mdr_signature = current
+            return
+        if self.pool is not None:
+            print("MDR file changed; switching to it once the running comparisons finish.", flush=True)
+            self.collect(wait=True)
+            self.pool.shutdown()
+        self.initargs = initargs
+        self.start_pool()
+        self.mdr_signature = current
+        print(f"Loaded {os.path.basename(self.mdr)} ({len(mdr_df)} relevant rows) in {time.perf_counter() - start:.1f}s.", flush=True)
+
+    def start_pool(self):
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=self.initargs)
+
+    def restart_pool(self):
+        # A worker process that dies breaks the whole pool; start a new one with the same MDR.
+        print("A worker process stopped unexpectedly; restarting the workers.", flush=True)
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.start_pool()
+
+    def settled(self, path, current, now):
+        # True once a file has kept the same signature for settle seconds and opens as a complete .xlsx.
+        seen, since = self.changing.get(path, (None, now))
+        if seen != current:
+            self.changing[path] = (current, now) # New or still changing: start the settle timer again.
+            return False
+        if now - since < self.settle:
+            return False
+        if not zipfile.is_zipfile(path):
+            self.changing[path] = (current, now) # Not a complete workbook yet.
+            return False
+        del self.changing[path]
+        return True
+
+    def ready(self):
+        """
+        Finds the exports that are new or changed and have finished being written.
+
+        Returns:
+            list: (path, signature) pairs to compare.
+        """
+        now = time.monotonic()
+        busy = {path for path, _ in self.running.values()}
+        found = []
+        for path in self.exports():
+            try:
+                current = signature(path)
+            except FileNotFoundError:
+                continue
+            if self.done.get(path) == current or path in busy:
+                continue
+            if self.settled(path, current, now):
+                found.append((path, current))
+        return found
+
+    def submit(self, path, current):
+        print(f"Comparing {os.path.basename(path)}...", flush=True)
+        args = (compare_study, path, self.mdr, None, datetime.now(), self.incremental, self.formats)
+        try:
+            future = self.pool.submit(*args)
+        except BrokenProcessPool:
+            self.restart_pool()
+            future = self.pool.submit(*args)
+        self.done[path] = current # Only once it is queued, so an export that couldn't be is tried again.
+        self.running[future] = (path, current)
+
+    def collect(self, wait=False):
+        # Reports the comparisons that finished. Returns their summary rows.
+        # Exports whose worker died are queued again on a new pool, up to MAX_RETRIES times.
+        rows = []
+        lost = []
+        for future in list(self.running):
+            if not wait and not future.done():
+                continue
+            path, current = self.running.pop(future)
+            try:
+                row = future.result()
+            except BrokenProcessPool:
+                lost.append((path, current))
+                continue
+            except Exception as e:
+                row = _summary_row(path, "Error", f"{type(e).__name__}: {e}")
+            self.retries.pop(path, None)
+            rows.append(row)
+            if row["Status"] == "OK":
+                print(f"OK    {os.path.basename(path)}: {row['Missing Fields']} missing field(s) in {row['Seconds']}s -> {row['Output File']}", flush=True)
+            else:
+                print(f"Error {os.path.basename(path)}: {row['Error']}", flush=True)
+        if lost:
+            self.restart_pool()
+            for path, current in lost:
+                self.retries[path] = self.retries.get(path, 0) + 1
+                if self.retries[path] > MAX_RETRIES:
+                    # Left in done, so it is only tried again once the file changes.
+                    row = _summary_row(path, "Error", "The worker comparing it stopped unexpectedly (out of memory?).")
+                    rows.append(row)
+                    print(f"Error {os.path.basename(path)}: {row['Error']}", flush=True)
+                    del self.retries[path]
+                else:
+                    self.submit(path, current)
+        return rows
+
+    def poll(self):
+        # One pass: reload the MDR if needed, report finished comparisons and queue the exports that are ready.
+        self.load_mdr()
+        rows = self.collect()
+        for path, current in self.ready():
+            self.submit(path, current)
+        return rows
+
+    def run(self, interval=2, stop=None):
+        """
+        Watches until interrupted (Ctrl+C) or stop() returns True.
+
+        Args:
+            interval (float): Seconds between polls of the folder.
+            stop (callable): Optional. Checked after every poll.
+        """
+        print(f"Watching {os.path.abspath(self.folder)} for RCC exports. Press Ctrl+C to stop.", flush=True)
+        try:
+            self.load_mdr() # Outside the retries below, so an MDR that can't be read stops the watcher straight away.
+            while True:
+                try:
+                    self.poll()
+                except Exception as e:
+                    # ex: the folder is briefly unreachable on a network share. Try again on the next poll.
+                    print(f"Error while watching: {type(e).__name__}: {e}", flush=True)
+                if stop is not None and stop():
+                    break
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if self.pool is not None:
+                self.pool.shutdown(cancel_futures=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare every RCC metadata export dropped into a folder against one MDR.")
+    parser.add_argument("--mdr", required=True, help="MDR file (MDR_RCC_metadata_<Mon>_<DD>_<YYYY>.xlsx). Reloaded when it changes.")
+    parser.add_argument("folder", help="Folder to watch. Outputs are written next to each export.")
+    parser.add_argument("--interval", type=float, default=2, help="Seconds between checks of the folder.")
+    parser.add_argument("--settle", type=float, default=5, help="Seconds a file must stay unchanged before it is compared.")
+    parser.add_argument("--workers", type=int, default=2, help="Number of worker processes.")
+    parser.add_argument("--existing", action="store_true", help="Also compare the exports already in the folder.")
+    parser.add_argument("--incremental", action="store_true", help="Only recompute forms that changed since each study's last run, and list the changes.")
+    parser.add_argument("--also", action="append", choices=["csv", "parquet"], default=[], help="Also write each result as CSV or Parquet next to its workbook. Can be given twice.")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.folder):
+        print(f"'{args.folder}' is not a folder.")
+        return 2
+    if not check_file_for_sheet("Data", args.mdr):
+        print("'Data' sheet not found in the MDR file.")
+        return 2
+    FolderWatcher(args.mdr, args.folder, args.settle, args.workers, args.incremental, args.also, args.existing).run(args.interval)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
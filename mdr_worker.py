@@ -0,0 +1,195 @@
+import asyncio
+import multiprocessing
+import queue
+import time
+from mdr_profile import Profile
+
+# Runs one comparison, or the parsing of one sheet, in a process of its own, so it can report progress while
+# it runs and be stopped. Unlike a pool worker, the process can be terminated, which frees all of its memory at once.
+
+STAGE_LABELS = {
+    "read_rcc": "Reading RCC export",
+    "read_mdr": "Reading MDR",
+    "isolate_mdr": "Finding the study's MDR forms",
+    "map_rcc_formnames": "Mapping forms",
+    "map_rcc_itemnames": "Matching items",
+    "intern_names": "Indexing names",
+    "create_fake_study": "Listing mandatory fields",
+    "return_missing_fields": "Finding missing fields",
+}
+
+def describe(event):
+    """
+    Turns a progress event into a line for the user.
+
+    Args:
+        event (dict): Event from Profile (see Profile's on_event), or a 'done' / 'error' event from a WorkerJob.
+
+    Returns:
+        str: ex: 'Reading MDR: 120,000 rows' or 'Mapping forms: 1,465 rows in, 1,264 out (0.2s)'.
+    """
+    label = STAGE_LABELS.get(event.get("stage"), event.get("stage"))
+    if event["event"] == "progress":
+        return f"{label}: {event['rows']:,} rows"
+    if event["event"] == "stage_done":
+        record = event["record"]
+        if record["Rows Out"] is None: # The stage failed, or doesn't count rows.
+            return f"{label} ({record['Seconds']:.1f}s)"
+        if record["Rows In"] is not None:
+            return f"{label}: {record['Rows In']:,} rows in, {record['Rows Out']:,} out ({record['Seconds']:.1f}s)"
+        return f"{label}: {record['Rows Out']:,} rows ({record['Seconds']:.1f}s)"
+    if event["event"] == "stage":
+        return f"{label}..."
+    return event.get("error", "Complete.")
+
+def _notify(on_event, event):
+    # A failing progress display must not stop the job from being finished and its outcome reported.
+    if on_event is None:
+        return
+    try:
+        on_event(event)
+    except Exception as e:
+        print(f"Progress callback failed on {event['event']} event: {type(e).__name__}: {e}")
+
+def _run(events, rcc, mdr, form_index, memory):
+    from mdr_engine import compare_files
+    profile = Profile(memory=memory or "process", on_event=events.put) # The process is the job's own, so its peak is the job's.
+    try:
+        result = compare_files(rcc, mdr, form_index, profile)
+        events.put({"event": "done", "result": result, "profile": profile})
+    except Exception as e:
+        events.put({"event": "error", "error": f"{type(e).__name__}: {e}"})
+
+def _read(events, filename, sheetname):
+    from mdr_engine import read_sheet
+    profile = Profile(memory="process", on_event=events.put)
+    try:
+        with profile.stage("read_mdr" if sheetname == "Data" else "read_rcc") as stage:
+            df = read_sheet(filename, sheetname, profile.progress)
+            stage["Rows Out"] = len(df)
+        events.put({"event": "done", "result": df, "profile": profile})
+    except Exception as e:
+        events.put({"event": "error", "error": f"{type(e).__name__}: {e}"})
+
+class WorkerJob:
+    """
+    A function run in its own process, which sends its progress events and its outcome back through a queue.
+
+    Args:
+        target (callable): Module-level function, called with the event queue followed by args.
+        args (tuple): Its other arguments.
+    """
+    def __init__(self, target, args):
+        context = multiprocessing.get_context("spawn") # The app's own threads must not be forked into the worker.
+        self.events = context.Queue()
+        self.process = context.Process(target=target, args=(self.events,) + tuple(args), daemon=True)
+        self.result = None
+        self.profile = None
+        self.error = None
+        self.done = False
+        self.on_event = None # Called with each event by whoever waits for the job. Can be replaced while it runs.
+
+    def start(self):
+        self.process.start()
+        return self
+
+    def poll(self):
+        """
+        Collects the events the worker sent since the last poll, and notices when it has finished.
+
+        Returns:
+            list: Events, oldest first. After the last one, done is True and result/profile or error are set.
+        """
+        received = []
+        while not self.done:
+            try:
+                # Once the process is gone, wait briefly for anything still in the pipe.
+                event = self.events.get(timeout=1) if not self.process.is_alive() else self.events.get_nowait()
+            except queue.Empty:
+                if not self.process.is_alive():
+                    self._finish(f"The worker process stopped unexpectedly (exit code {self.process.exitcode}).")
+                break
+            if event["event"] == "done":
+                self.result, self.profile = event["result"], event["profile"]
+                self._finish(None)
+            elif event["event"] == "error":
+                self._finish(event["error"])
+            received.append(event)
+        return received
+
+    def cancel(self, reason="Cancelled."):
+        # Terminates the worker. Safe to call more than once, or after the job finished.
+        if not self.done:
+            self.process.terminate()
+            self._finish(reason)
+
+    def _finish(self, error):
+        self.error = error
+        self.done = True
+        self.process.join()
+        self.events.close()
+
+    def wait(self, timeout=None, on_event=None):
+        """
+        Blocks until the job finishes, is cancelled or runs past timeout.
+
+        Args:
+            timeout (float): Seconds to allow before cancelling the job. None waits as long as it takes.
+            on_event (callable): Optional. Called with each event as it arrives. Replaces the job's on_event.
+
+        Returns:
+            pd.DataFrame: The result. Raises RuntimeError with the reason if there is none.
+        """
+        if on_event is not None:
+            self.on_event = on_event
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.done:
+            for event in self.poll():
+                _notify(self.on_event, event)
+            if deadline is not None and time.monotonic() > deadline:
+                self.cancel(f"Timed out after {timeout:g}s.")
+            time.sleep(0.1)
+        return self._outcome()
+
+    async def wait_async(self, timeout=None, on_event=None):
+        # wait() for the event loop: polls between other work instead of blocking it.
+        if on_event is not None:
+            self.on_event = on_event
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.done:
+            for event in self.poll():
+                _notify(self.on_event, event)
+            if deadline is not None and time.monotonic() > deadline:
+                self.cancel(f"Timed out after {timeout:g}s.")
+            await asyncio.sleep(0.1)
+        return self._outcome()
+
+    def _outcome(self):
+        if self.error is not None:
+            raise RuntimeError(self.error)
+        return self.result
+
+class ComparisonJob(WorkerJob):
+    """
+    One compare_files run in its own process.
+
+    Args:
+        rcc (str or pd.DataFrame): RCC export path, or its loaded 'Item' sheet.
+        mdr (str or pd.DataFrame): MDR path, or its loaded 'Data' sheet.
+        form_index (PrefixIndex): Optional mdr_form_index over the same MDR.
+        memory (bool): Record the peak memory each stage needed with tracemalloc. It makes reading the files
+            several times slower, so by default only the worker process's peak so far is recorded.
+    """
+    def __init__(self, rcc, mdr, form_index=None, memory=False):
+        super().__init__(_run, (rcc, mdr, form_index, memory))
+
+class SheetJob(WorkerJob):
+    """
+    Parses the RCC 'Item' sheet or the MDR 'Data' sheet (see read_sheet) in its own process, reporting rows read.
+
+    Args:
+        filename (str): Path to the .xlsx file.
+        sheetname (str): 'Item' or 'Data'.
+    """
+    def __init__(self, filename, sheetname):
+        super().__init__(_read, (filename, sheetname))
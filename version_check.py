@@ -0,0 +1,89 @@
+import argparse
+import json
+import os
+import time
+
+# Checks whether this copy of the app is the newest version, without holding up startup.
+# The latest version number is cached on disk for CACHE_TTL seconds, so most launches don't touch the
+# network, and a failed or slow request falls back to the last known version.
+#
+# To try it against a local stand-in for GitHub:
+#   py -m http.server 8000                                     (in a folder with a version.txt)
+#   py version_check.py --url http://127.0.0.1:8000/version.txt --no-cache
+
+VERSION_URL = os.environ.get("MDR_VERSION_URL", "https://raw.githubusercontent.com/malib-pfe/MDRComparisonTool/refs/heads/main/version.txt")
+CACHE_TTL = 12 * 60 * 60 # Seconds a fetched version number is trusted for.
+TIMEOUT = 3 # Seconds to wait for GitHub before falling back to the cache.
+
+def default_cache_path():
+    # Same per-user folder as the MDR snapshots. Not imported from mdr_snapshot, which would pull in pandas.
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "MDRComparisonTool", "version.json")
+
+def read_file_from_github(raw_url, timeout=TIMEOUT):
+    """
+    Reads a file from GitHub using its raw URL.
+
+    Args:
+        raw_url (str): The raw URL of the file on GitHub.
+        timeout (float): Seconds to wait for a connection and for the response.
+
+    Returns:
+        str: The content of the file, or None if an error occurred.
+    """
+    import requests # Imported here so it doesn't slow down opening the window.
+    try:
+        response = requests.get(raw_url, timeout=timeout)
+        response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
+        return response.text
+    except requests.exceptions.RequestException as e:
+        print(f"Error reading file from GitHub: {e}")
+        return None
+
+def _read_cache(cache_path, url):
+    try:
+        with open(cache_path) as f:
+            cached = json.load(f)
+        return cached if cached.get("url") == url else None
+    except (OSError, ValueError):
+        return None
+
+def latest_version(url=VERSION_URL, cache_path=None, ttl=CACHE_TTL, timeout=TIMEOUT):
+    """
+    Returns the newest published version number, from the cache while it is fresh and from url otherwise.
+
+    Args:
+        url (str): Raw URL of version.txt.
+        cache_path (str): JSON file to cache the version in. Defaults to default_cache_path(). Pass '' to not use a cache.
+        ttl (float): Seconds a cached version is used without asking url again.
+        timeout (float): Seconds to wait for url.
+
+    Returns:
+        str: The version number, a stale cached one if url could not be reached, or None if neither is available.
+    """
+    cache_path = default_cache_path() if cache_path is None else cache_path
+    cached = _read_cache(cache_path, url) if cache_path else None
+    if cached and time.time() - cached["checked"] < ttl:
+        return cached["version"]
+
+    content = read_file_from_github(url, timeout)
+    if content is None:
+        return cached["version"] if cached else None
+    version = content.strip()
+    if cache_path:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(cache_path + ".tmp", "w") as f:
+            json.dump({"url": url, "version": version, "checked": time.time()}, f)
+        os.replace(cache_path + ".tmp", cache_path)
+    return version
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print the newest published version of the app.")
+    parser.add_argument("--url", default=VERSION_URL, help="Raw URL of version.txt.")
+    parser.add_argument("--timeout", type=float, default=TIMEOUT, help="Seconds to wait for the URL.")
+    parser.add_argument("--no-cache", action="store_true", help="Always ask the URL, and don't update the cache.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    version = latest_version(args.url, "" if args.no_cache else None, timeout=args.timeout)
+    print(f"Latest version: {version} ({time.perf_counter() - start:.2f}s)")
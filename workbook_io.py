@@ -0,0 +1,319 @@
+import html
+import os
+import posixpath
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+import numpy as np
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+# Fast .xlsx reading. The inspection functions read the workbook manifest and the first row of a sheet
+# straight from the zip archive, so checking a file doesn't depend on how many rows it has.
+# read_columns streams a sheet and only keeps the columns and rows the comparison needs.
+
+REL_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+AUTO_FILTER = re.compile(rb'<(?:\w+:)?autoFilter\b[^>]*?\bref="([^"]*)"')
+
+# Pieces of a cell element, for scanning sheet XML without building a tree.
+CELL_TYPE = re.compile(rb'\bt="(\w+)"')
+CELL_VALUE = re.compile(rb'<(?:\w+:)?v>(.*?)</(?:\w+:)?v>', re.S)
+CELL_TEXT = re.compile(rb'<(?:\w+:)?t\b[^>]*?(?:/>|>(.*?)</(?:\w+:)?t>)', re.S)
+SHARED_STRING = re.compile(rb'<(?:\w+:)?si\b[^>]*?(?:/>|>(.*?)</(?:\w+:)?si>)', re.S)
+PHONETIC = re.compile(rb'<(?:\w+:)?rPh\b.*?</(?:\w+:)?rPh>', re.S)
+
+def _local(tag):
+    # Strips the namespace from an XML tag. Covers both transitional and strict workbooks.
+    return tag.rsplit('}', 1)[-1]
+
+def _sheet_paths(zf):
+    # Maps each sheet name to its XML file in the archive, in workbook order.
+    targets = {}
+    for rel in ET.fromstring(zf.read("xl/_rels/workbook.xml.rels")):
+        target = rel.get("Target")
+        if target.startswith('/'):
+            targets[rel.get("Id")] = target.lstrip('/')
+        else:
+            targets[rel.get("Id")] = posixpath.normpath(posixpath.join("xl", target))
+    paths = {}
+    for element in ET.fromstring(zf.read("xl/workbook.xml")).iter():
+        if _local(element.tag) == "sheet":
+            paths[element.get("name")] = targets.get(element.get(REL_ID))
+    return paths
+
+def _shared_strings(zf, count=None):
+    # Reads the shared strings table, or only its first count strings (ex: the ones a header row points at).
+    # Without count the whole table is read, since cells anywhere in a sheet can point into it.
+    strings = []
+    if count == 0 or "xl/sharedStrings.xml" not in zf.namelist():
+        return strings
+    buffer = b''
+    with zf.open("xl/sharedStrings.xml") as f:
+        while chunk := f.read(1 << 20):
+            buffer += chunk
+            cut = _complete(buffer, b"si>")
+            strings.extend(_text(content) for content in SHARED_STRING.findall(buffer, 0, cut))
+            buffer = buffer[cut:]
+            if count is not None and len(strings) >= count:
+                break
+    return strings
+
+def _complete(buffer, closing):
+    # Position just after the last closing tag (ex: b'row>') in buffer. Scanning stops there so that
+    # elements split across two chunks are left for the next chunk.
+    position = len(buffer)
+    while (position := buffer.rfind(closing, 0, position)) != -1:
+        start = buffer.rfind(b"</", 0, position)
+        if start != -1 and re.fullmatch(rb'(?:\w+:)?', buffer[start + 2:position]):
+            return position + len(closing)
+    return 0
+
+def _text(content):
+    # Text of a shared or inline string from its inner XML. Rich text is split into runs; phonetic hints (rPh) are not part of the value.
+    if b'<' not in content:
+        return ''
+    return "".join(_unescape(text) for text in CELL_TEXT.findall(PHONETIC.sub(b'', content)))
+
+def _first_row(zf, path):
+    # Returns the row number of the first row and its cells as (column index, type, raw value), without reading further.
+    cells = []
+    with zf.open(path) as f:
+        for event, element in ET.iterparse(f, events=("end",)):
+            tag = _local(element.tag)
+            if tag == "row":
+                return int(element.get('r', 1)), cells
+            elif tag == 'c':
+                value = None
+                for child in element:
+                    if _local(child.tag) == 'v':
+                        value = child.text
+                    elif _local(child.tag) == "is":
+                        value = _text(ET.tostring(child))
+                cells.append((_column_index(element.get('r')), element.get('t'), value))
+            elif tag == "sheetData":
+                break # Empty sheet.
+    return 0, cells
+
+def _convert(kind, value, strings):
+    # Converts a raw cell value the same way openpyxl does for pd.read_excel: numbers, booleans and strings.
+    if value is None:
+        return np.nan
+    if kind == 's':
+        value = strings[int(value)]
+    elif kind == 'b':
+        return value == '1'
+    elif kind not in ("str", "inlineStr", 'e'):
+        try:
+            return int(value)
+        except ValueError:
+            number = float(value)
+            return int(number) if number.is_integer() else number
+    return value
+
+def _scanned_value(attributes, content, strings):
+    # Value of a cell matched by _cell_pattern, from its attributes and inner XML.
+    kind = CELL_TYPE.search(attributes)
+    kind = kind.group(1).decode() if kind else None
+    if not content:
+        return np.nan
+    if kind == "inlineStr":
+        value = _text(content)
+    else:
+        value = CELL_VALUE.search(content)
+        if value is None:
+            value = None
+        elif kind == 's':
+            value = value.group(1) # Shared string index; no need to decode.
+        else:
+            value = _unescape(value.group(1))
+    return _convert(kind, value, strings)
+
+def _unescape(raw):
+    # XML text to str. Line endings are normalized the way an XML parser would.
+    text = raw.decode("utf-8")
+    if '&' in text:
+        text = html.unescape(text)
+    return text.replace("\r\n", "\n").replace('\r', '\n') if '\r' in text else text
+
+def _cell_pattern(letters):
+    # Matches only the cells in the given columns, capturing column letters, row number, attributes and inner XML.
+    alternatives = b'|'.join(re.escape(letter.encode()) for letter in letters)
+    return re.compile(rb'<(?:\w+:)?c\b([^>]*?\br="(' + alternatives + rb')(\d+)"[^>]*?)(?:/>|>(.*?)</(?:\w+:)?c>)', re.S)
+
+def _column_letters(index):
+    # 2 -> 'C'. Inverse of _column_index.
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+def _column_index(ref):
+    # 'C1' -> 2. Cells without a reference are numbered by position by the caller.
+    if ref is None:
+        return None
+    index = 0
+    for char in ref:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - ord('A') + 1
+    return index - 1
+
+def read_sheet_names(filename):
+    """
+    Reads the sheet names of a workbook from its manifest only.
+
+    Args:
+        filename (str): Path to the .xlsx file.
+
+    Returns:
+        list: Sheet names in workbook order.
+    """
+    with zipfile.ZipFile(filename) as zf:
+        return list(_sheet_paths(zf))
+
+def read_header(filename, sheetname):
+    """
+    Reads the column names in the first row of a sheet without loading the rest of it.
+
+    Args:
+        filename (str): Path to the .xlsx file.
+        sheetname (str): Name of the sheet to read.
+
+    Returns:
+        list: Header values as strings, with None for empty cells. Raises KeyError if the sheet does not exist.
+    """
+    with zipfile.ZipFile(filename) as zf:
+        row_number, cells = _first_row(zf, _sheet_paths(zf)[sheetname])
+        indices = [int(value) for col, kind, value in cells if kind == 's' and value is not None]
+        strings = _shared_strings(zf, max(indices) + 1 if indices else 0)
+    header = []
+    for position, (col, kind, value) in enumerate(cells):
+        col = position if col is None else col
+        if value is not None and kind == 's':
+            value = strings[int(value)] if int(value) < len(strings) else None
+        header.extend([None] * (col - len(header)))
+        header.append(value)
+    return header
+
+def read_auto_filter(filename, sheetname):
+    """
+    Reads the auto-filter range of a sheet, if it has one.
+
+    The filter is stored after the cell data, so the sheet is decompressed and scanned as raw bytes
+    instead of being parsed as XML.
+
+    Args:
+        filename (str): Path to the .xlsx file.
+        sheetname (str): Name of the sheet to read.
+
+    Returns:
+        str: The filtered range (ex: 'A1:BT1466'), or None if the sheet has no auto-filter.
+    """
+    with zipfile.ZipFile(filename) as zf:
+        path = _sheet_paths(zf)[sheetname]
+        tail = b''
+        with zf.open(path) as f:
+            # Keep an overlap between chunks so a tag split across two chunks is still found.
+            while chunk := f.read(1 << 20):
+                tail = tail[-1024:] + chunk
+                match = AUTO_FILTER.search(tail)
+                if match:
+                    return match.group(1).decode()
+    return None
+
+def default_engine():
+    # The streaming reader, unless MDR_XLSX_ENGINE asks for 'calamine' (python-calamine, optional) or 'openpyxl'.
+    return os.environ.get("MDR_XLSX_ENGINE", "stream")
+
+def read_columns(filename, sheetname, columns, row_filter=None, engine=None, progress=None, frame_filter=None):
+    """
+    Reads only the given columns of a sheet, dropping rows that don't pass row_filter as they are read.
+
+    The streaming engine scans the decompressed sheet for the cells of the requested columns only and
+    converts a row once all of its cells are read, so memory and parse time follow the rows and columns
+    kept rather than the whole sheet. Rows with none of the columns filled in are skipped.
+
+    Args:
+        filename (str): Path to the .xlsx file.
+        sheetname (str): Name of the sheet to read.
+        columns (list): Column names to keep, in output order.
+        row_filter (callable): Optional. Called with a dict of column name -> raw cell value for each row; rows are kept when it returns True.
+            Values are as stored in the sheet, before type inference (ex: a boolean may still be the string 'TRUE').
+        engine (str): 'stream', 'calamine' or 'openpyxl'. Defaults to default_engine(). The pandas engines
+            ('calamine', 'openpyxl') load the whole sheet before filtering it.
+        progress (callable): Optional. Called with the number of rows read so far, about once per MB of sheet data.
+            The pandas engines only report once, when the sheet is loaded.
+        frame_filter (callable): Optional. row_filter for a whole DataFrame of raw values at once, returning a boolean
+            mask. The pandas engines use it instead of calling row_filter on every row.
+
+    Returns:
+        pd.DataFrame: The kept rows, with a fresh index. Raises ValueError if a column is not in the header.
+    """
+    engine = engine or default_engine()
+    if engine in ("calamine", "openpyxl"):
+        return _read_columns_pandas(filename, sheetname, columns, row_filter, engine, progress, frame_filter)
+    if engine != "stream":
+        raise ValueError(f"Unknown engine '{engine}'.")
+
+    with zipfile.ZipFile(filename) as zf:
+        path = _sheet_paths(zf)[sheetname]
+        header_row, cells = _first_row(zf, path)
+        if any(col is None for col, kind, value in cells):
+            # Cells without references can't be scanned for by column; let pandas lay the sheet out instead.
+            return _read_columns_pandas(filename, sheetname, columns, row_filter, "openpyxl", progress, frame_filter)
+        header = read_header(filename, sheetname)
+        positions = {} # Column letters -> column name. Duplicate headers: the first one wins, like pandas.
+        for col, name in enumerate(header):
+            if name in columns and name not in positions.values():
+                positions[_column_letters(col)] = name
+        missing = [column for column in columns if column not in positions.values()]
+        if missing:
+            raise ValueError(f"Columns {missing} not found in sheet '{sheetname}'.")
+
+        strings = _shared_strings(zf)
+        pattern = _cell_pattern(positions)
+        rows = []
+        def add(row):
+            if row_filter is None or row_filter(row):
+                rows.append([row.get(column, np.nan) for column in columns])
+
+        row, row_number = {}, None
+        buffer = b''
+        with zf.open(path) as f:
+            while chunk := f.read(1 << 20):
+                buffer += chunk
+                cut = _complete(buffer, b"row>")
+                for match in pattern.finditer(buffer, 0, cut):
+                    attributes, letters, number, content = match.groups()
+                    number = int(number)
+                    if number <= header_row:
+                        continue
+                    if number != row_number:
+                        if row_number is not None:
+                            add(row)
+                        row, row_number = {}, number
+                    row[positions[letters.decode()]] = _scanned_value(attributes, content, strings)
+                buffer = buffer[cut:]
+                if progress is not None and row_number is not None:
+                    progress(row_number - header_row)
+        if row_number is not None:
+            add(row)
+    # pd.read_excel's own parser infers the column types (numbers, booleans, 'NA' strings, ...), so the result matches it.
+    return TextParser([list(columns)] + rows, header=0).read()
+
+def _read_columns_pandas(filename, sheetname, columns, row_filter, engine, progress=None, frame_filter=None):
+    # Cells are kept as objects until the rows are filtered, so the column types are inferred from the kept rows, as in the streaming engine.
+    df = pd.read_excel(filename, sheet_name=sheetname, engine=engine, usecols=lambda name: name in columns, dtype=object)
+    missing = [column for column in columns if column not in df.columns]
+    if missing:
+        raise ValueError(f"Columns {missing} not found in sheet '{sheetname}'.")
+    df = df[columns].dropna(how="all") # The streaming engine never sees rows without any of the columns.
+    if progress is not None:
+        progress(len(df))
+    if frame_filter is not None:
+        df = df[frame_filter(df).to_numpy(dtype=bool)]
+    elif row_filter is not None:
+        df = df[[bool(row_filter(row)) for row in df.to_dict("records")]]
+    return TextParser([list(columns)] + df.values.tolist(), header=0).read()